@@ -1,16 +1,45 @@
 import os
 import requests
 import json
+import logging
+import threading
+import time
+from types import SimpleNamespace
 from django.conf import settings
-from langchain.agents import AgentExecutor, create_json_agent
-from langchain.llms import GoogleGenerativeAI
-from langchain_community.chat_models import ChatGoogleGenerativeAI
-from langchain.tools import tool, Tool
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from .router import IntentRouter, router_stats
+from .tool_runner import ParallelToolRunner, ToolCall, format_results, tool_timeout
+# LangChain/Gemini are imported lazily by load_langchain(): pulling them in costs seconds and
+# tens of MB per process, which every manage.py command and test run would otherwise pay.
 # from langchain_google_genai import GoogleGenerativeAIEmbeddings # For RAG
 # from langchain.vectorstores import PGVector # If using pgvector explicitly
 
+logger = logging.getLogger(__name__)
+
+_langchain = None
+_langchain_lock = threading.Lock()
+_tools = None
+
+def load_langchain():
+    """Imports the LangChain/Gemini stack on first use and caches the handles."""
+    global _langchain
+    if _langchain is None:
+        with _langchain_lock:
+            if _langchain is None:
+                from langchain.agents import AgentExecutor, create_json_agent
+                from langchain_community.chat_models import ChatGoogleGenerativeAI
+                from langchain.tools import tool
+                _langchain = SimpleNamespace(
+                    AgentExecutor=AgentExecutor,
+                    create_json_agent=create_json_agent,
+                    ChatGoogleGenerativeAI=ChatGoogleGenerativeAI,
+                    tool=tool,
+                )
+    return _langchain
+
+def preload():
+    """Warms the LangChain stack and tool wrappers so the first chat request doesn't pay for it."""
+    get_tools()
+
 # Dummy ML model for crop recommendation (replace with actual joblib load)
 class CropRecommendationModel:
     def predict(self, N, P, K, temperature, humidity, ph, rainfall):
@@ -27,31 +56,28 @@ crop_model = CropRecommendationModel()
 
 # --- Define Tools for Agents ---
 
-@tool
 def get_weather_forecast(pin_code: str) -> str:
     """Fetches current weather forecast, temperature, humidity for a given Indian pincode."""
     api_key = settings.OPENWEATHER_API_KEY
     if not api_key:
         return "Weather API key not configured."
     try:
-        # OpenWeatherMap sometimes uses city/zip. For Indian pincodes, cross-referencing is needed or use a different API.
-        # For simplicity, simulating with a city lookup or generic response.
-        # A more robust solution involves a geo-coding API to convert pin_code to lat/lon.
-        # Let's assume a mapping or a direct city name for now.
-        if pin_code == '110001': # Example for Delhi
-            city_name = "Delhi,IN"
-        elif pin_code == '400001': # Example for Mumbai
-            city_name = "Mumbai,IN"
+        # OpenWeatherMap doesn't know Indian pincodes, so resolve the pincode centroid and query by lat/lon
+        from geo.pincodes import get_index # numpy-backed, kept off the chatbot import path
+        point = get_index().locate(pin_code)
+        if point:
+            lat, lon = point
+            url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
         else:
-            city_name = "India" # Fallback or error
-
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={city_name}&appid={api_key}&units=metric"
-        response = requests.get(url)
+            url = f"http://api.openweathermap.org/data/2.5/weather?q=India&appid={api_key}&units=metric" # Fallback for unknown pins
+        # The runner can't interrupt a call it timed out, so bound the request itself by the same budget
+        response = requests.get(url, timeout=tool_timeout('get_weather_forecast'))
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
         data = response.json()
+        city_name = data.get('name') or "India"
         
         main_data = data.get('main', {})
-        weather_description = data.get('weather', [{}])[0].get('description', 'N/A')
+        weather_description = (data.get('weather') or [{}])[0].get('description', 'N/A') # OpenWeather can send "weather": []
         temp = main_data.get('temp', 'N/A')
         humidity = main_data.get('humidity', 'N/A')
         
@@ -60,7 +86,6 @@ def get_weather_forecast(pin_code: str) -> str:
         return f"Error fetching weather forecast: {e}. Please ensure the pin code or API key is valid."
 
 
-@tool
 def get_market_prices(crop_name: str, location_pin_code: str = None) -> str:
     """Scrapes or looks up current market prices for a specific crop. Can be refined by location."""
     # This would involve actual web scraping (BeautifulSoup) or using an agriculture market API
@@ -74,16 +99,17 @@ def get_market_prices(crop_name: str, location_pin_code: str = None) -> str:
     
     if crop_name_lower in crop_prices:
         if location_pin_code:
-            # Map pin_code to city for price lookup
-            city_map = {'110001': 'delhi', '400001': 'mumbai'}
-            city = city_map.get(location_pin_code, 'delhi') # Default to delhi
+            # Use the market closest to the pin code for price lookup
+            from geo.pincodes import get_index
+            market_pin_codes = {'110001': 'delhi', '400001': 'mumbai'}
+            nearest_market = get_index().nearest(location_pin_code, market_pin_codes)
+            city = market_pin_codes.get(nearest_market, 'delhi') # Default to delhi
             price = crop_prices[crop_name_lower].get(city, "Price not available for this location.")
             return f"Current market price for {crop_name} in {city.capitalize()} (pin code {location_pin_code}): {price}"
         else:
             return f"Current market price for {crop_name}: Delhi: {crop_prices[crop_name_lower].get('delhi')}, Mumbai: {crop_prices[crop_name_lower].get('mumbai')}. Please provide a pin code for specific location."
     return f"Market prices for {crop_name} not available in our current data."
 
-@tool
 def recommend_crop(N: float, P: float, K: float, temperature: float, humidity: float, ph: float, rainfall: float) -> str:
     """Recommends a suitable crop based on N (Nitrogen), P (Phosphorus), K (Potassium) levels, temperature (°C), humidity (%), soil pH, and rainfall (mm).
        Example Usage: recommend_crop(90, 42, 43, 20.8, 82, 6.5, 202.9)
@@ -94,7 +120,6 @@ def recommend_crop(N: float, P: float, K: float, temperature: float, humidity: f
     except Exception as e:
         return f"Error in crop recommendation: {e}. Please check the input parameters."
 
-@tool
 def analyze_crop_image(image_url: str) -> str:
     """Analyzes an uploaded image of a crop to identify diseases or pests. Returns diagnosis and potential remedies."""
     # This would call an external API (e.g., Roboflow or a custom CV model deployed elsewhere)
@@ -107,45 +132,112 @@ def analyze_crop_image(image_url: str) -> str:
         return "Unable to diagnose from the image. Please provide a clearer image or consult an expert."
 
 
+TOOL_FUNCTIONS = {
+    'get_weather_forecast': get_weather_forecast,
+    'get_market_prices': get_market_prices,
+    'recommend_crop': recommend_crop,
+    'analyze_crop_image': analyze_crop_image,
+    # Add more tools here (e.g., Knowledge Agent for RAG)
+}
+
+def get_tools():
+    """LangChain tool wrappers for the functions above, built once per process."""
+    global _tools
+    if _tools is None:
+        tool = load_langchain().tool # takes _langchain_lock itself, so call it before acquiring
+        with _langchain_lock:
+            if _tools is None:
+                _tools = [tool(func) for func in TOOL_FUNCTIONS.values()]
+    return _tools
+
+
 # --- Define the multi-agent Orchestrator ---
 class KisanMitraOrchestrator:
     def __init__(self, user_pin_code=None):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.5, google_api_key=settings.GEMINI_API_KEY)
         self.user_pin_code = user_pin_code
+        # Independent tool calls are planned up front and run concurrently (see tool_runner.py)
+        self.tool_runner = ParallelToolRunner(TOOL_FUNCTIONS)
+        # Simple lookups skip the LLM entirely (see router.py)
+        self.router = IntentRouter()
+        self.last_metadata = None # How the last query was answered; stored on the AI ChatMessage
+
+        # The LLM and agent executor are only built when a query actually needs them
+        self.llm = None
+        self.tools = None
+        self.agent_executor = None
+
+    def _build_agent(self):
+        if self.agent_executor is not None:
+            return
+        lc = load_langchain()
+        self.llm = lc.ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.5, google_api_key=settings.GEMINI_API_KEY)
 
         # List all available tools
-        self.tools = [
-            get_weather_forecast,
-            get_market_prices,
-            recommend_crop,
-            analyze_crop_image,
-            # Add more tools here (e.g., Knowledge Agent for RAG)
-        ]
+        self.tools = get_tools()
 
         # Define the agent executor
         # We use create_react_agent or create_json_agent for more structured output
-        self.agent_executor = AgentExecutor.from_agent_and_tools(
-            agent=create_json_agent(self.llm, self.tools, verbose=True), # Use JSON agent for structured tool calls
+        self.agent_executor = lc.AgentExecutor.from_agent_and_tools(
+            agent=lc.create_json_agent(self.llm, self.tools, verbose=True), # Use JSON agent for structured tool calls
             tools=self.tools,
             verbose=True,
             handle_parsing_errors=True # Crucial for robustness
         )
 
     def process_query(self, query: str) -> str:
-        """Processes a user query using the multi-agent system."""
+        """Processes a user query, via the deterministic fast path when possible, else the multi-agent system."""
+        started = time.perf_counter()
+        route = self.router.route(query, self.user_pin_code)
+        fast_path_error = None
+        if self.router.accepts(route):
+            # Through the runner so CHATBOT_TOOL_TIMEOUTS applies; a failed lookup is retried by the agent
+            [(call, ok, response)] = self.tool_runner.run_with_status([ToolCall(route.tool, route.args)])
+            if ok:
+                self._record('fast', started, intent=route.intent, tool=route.tool, confidence=route.confidence)
+                return response
+            logger.warning(f"Fast path {call!r} failed, falling back to the agent: {response}")
+            fast_path_error = response
+
+        plan_tools = self.router.may_need_tools(route, query)
+        response = self.process_query_with_agent(query, plan_tools)
+        details = {'fast_path_error': fast_path_error} if fast_path_error else {}
+        self._record('agent', started, intent=route.intent, confidence=route.confidence, planned=plan_tools, **details)
+        return response
+
+    def _record(self, path, started, **details):
+        latency = time.perf_counter() - started
+        router_stats.record(path, latency)
+        self.last_metadata = {'path': path, 'latency_ms': round(latency * 1000, 1), **details}
+
+    def process_query_with_agent(self, query: str, plan_tools: bool = True) -> str:
+        """Processes a user query using the multi-agent system. plan_tools=False skips the up-front tool planning call."""
         # Add user's pin code to the query context if available, to help agents
         context_query = query
         if self.user_pin_code:
             context_query = f"User is located in pin code {self.user_pin_code}. " + query
         
         try:
-            # LangChain AgentExecutor will choose the best tool(s) based on the query
+            self._build_agent()
+            # Gather every independent tool result at once, then let the agent answer from them.
+            # LangChain AgentExecutor can still call further tools if something is missing.
+            if plan_tools:
+                context_query += format_results(self.run_planned_tools(context_query))
             response = self.agent_executor.invoke({"input": context_query})
             return response['output']
         except Exception as e:
             print(f"Error processing query with agent: {e}")
             return "I apologize, I encountered an error while processing your request. Could you please rephrase or try again later?"
 
+    def run_planned_tools(self, context_query: str):
+        """Asks the LLM which tools the query needs and runs them concurrently. Returns [(ToolCall, result)]."""
+        try:
+            plan = self.llm.invoke(self.tool_runner.plan_prompt(context_query))
+        except Exception as e:
+            logger.warning(f"Tool planning failed, falling back to the agent loop: {e}")
+            return []
+        calls = self.tool_runner.parse_plan(getattr(plan, 'content', plan))
+        return self.tool_runner.run(calls) if calls else []
+
 # Example of how you might integrate a RAG (Retrieval Augmented Generation) tool
 # For RAG, you'd need PGVector setup in Supabase and populate it with agricultural knowledge
 # from langchain.vectorstores import PGVector
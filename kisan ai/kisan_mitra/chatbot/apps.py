@@ -1,6 +1,25 @@
+import logging
+import time
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class ChatbotConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chatbot"
+
+    def ready(self):
+        # Off by default so manage.py commands and tests stay fast. Web workers opt in with
+        # CHATBOT_PRELOAD=True; combined with `gunicorn --preload` the import happens once in
+        # the master and forked workers share those pages.
+        if getattr(settings, 'CHATBOT_PRELOAD', False):
+            from .agents import preload
+            started = time.perf_counter()
+            try:
+                preload()
+            except ImportError as e:
+                logger.warning(f"Chatbot preload skipped, LangChain stack unavailable: {e}")
+                return
+            logger.info(f"Chatbot LangChain stack preloaded in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,26 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chatbot.retention import archive_sessions
+
+
+class Command(BaseCommand):
+    help = "Compresses the messages of idle chat sessions into ChatSessionArchive, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Archive sessions idle for this many days (default CHAT_RETENTION_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=None, help="Sessions per transaction (default CHAT_ARCHIVE_BATCH_SIZE).")
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else getattr(settings, 'CHAT_RETENTION_DAYS', 90)
+        started = time.perf_counter()
+        counts = archive_sessions(days, options['batch_size'], options['max_batches'], options['pause'])
+        elapsed = time.perf_counter() - started
+        ratio = counts['raw_bytes'] / counts['packed_bytes'] if counts['packed_bytes'] else 0
+        self.stdout.write(
+            f"Archived {counts['messages']} messages from {counts['sessions']} sessions idle > {days} days "
+            f"in {counts['batches']} batches, {elapsed:.1f}s ({counts['messages'] / elapsed if elapsed else 0:.0f} msg/s); "
+            f"{counts['raw_bytes'] / 1e6:.1f} MB of JSON packed into {counts['packed_bytes'] / 1e6:.1f} MB ({ratio:.1f}x)"
+        )
@@ -0,0 +1,110 @@
+import json
+import statistics
+import time
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand
+from chatbot.agents import KisanMitraOrchestrator
+from chatbot.tool_runner import ParallelToolRunner, ToolCall
+
+SOIL = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.8, 'humidity': 82, 'ph': 6.5, 'rainfall': 202.9}
+SCENARIOS = [
+    # (label, query, tool calls the question needs)
+    ("three tools", "what should I plant at 110001 given the weather, and what price will wheat fetch", [
+        ToolCall('get_weather_forecast', {'pin_code': '110001'}),
+        ToolCall('get_market_prices', {'crop_name': 'wheat', 'location_pin_code': '110001'}),
+        ToolCall('recommend_crop', SOIL),
+    ]),
+    ("zero tools", "how do I control aphids on mustard organically", []),
+]
+
+
+def stub(name, delay):
+    def tool(**kwargs):
+        time.sleep(delay)
+        return f"{name} result"
+    tool.__name__ = name
+    return tool
+
+
+class StubLLM:
+    """Answers the planning prompt with the scenario's calls after one simulated round trip."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+
+    def invoke(self, prompt):
+        time.sleep(self.delay)
+        return SimpleNamespace(content=json.dumps([{'tool': call.name, 'args': call.args} for call in self.calls]))
+
+
+class StubAgentExecutor:
+    """
+    The JSON agent loop: with the results already in its input it answers in one LLM step; otherwise
+    it spends an LLM step choosing each tool, runs it, and needs a final step to answer.
+    """
+
+    def __init__(self, llm, runner):
+        self.llm = llm
+        self.runner = runner
+
+    def invoke(self, data):
+        if "Tool results already gathered" not in data['input']:
+            for call in self.llm.calls:
+                time.sleep(self.llm.delay)
+                self.runner.run_sequential([call])
+        time.sleep(self.llm.delay)
+        return {'output': "answer"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Times KisanMitraOrchestrator.process_query for a multi-tool and a zero-tool question with a stubbed LLM "
+        "and stub tools with injected delays, with and without up-front planning and concurrent tool calls."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weather-delay', type=float, default=0.8)
+        parser.add_argument('--prices-delay', type=float, default=0.5)
+        parser.add_argument('--recommend-delay', type=float, default=0.1)
+        parser.add_argument('--llm-delay', type=float, default=0.7, help="Simulated latency of one LLM round trip.")
+        parser.add_argument('--timeout', type=float, default=None, help="Per-tool timeout; set below a delay to see the cut-off.")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        delays = {
+            'get_weather_forecast': options['weather_delay'],
+            'get_market_prices': options['prices_delay'],
+            'recommend_crop': options['recommend_delay'],
+        }
+        timeouts = {name: options['timeout'] for name in delays} if options['timeout'] else {}
+        runner = ParallelToolRunner({name: stub(name, delay) for name, delay in delays.items()}, timeouts=timeouts)
+        llm = StubLLM(options['llm_delay'])
+
+        orchestrator = KisanMitraOrchestrator(user_pin_code='110001')
+        orchestrator.tool_runner = runner
+        orchestrator.llm = llm # with both set, _build_agent() never loads LangChain
+        orchestrator.agent_executor = StubAgentExecutor(llm, runner)
+
+        def agent_loop(query):
+            # Before: no planning, the agent calls each tool itself
+            return orchestrator.process_query_with_agent(query, plan_tools=False)
+
+        def always_plan(query):
+            return orchestrator.process_query_with_agent(query, plan_tools=True)
+
+        for label, query, calls in SCENARIOS:
+            llm.calls = calls
+            self.stdout.write(f"{label}: {query!r}")
+            for mode, func in (
+                ("agent loop, sequential tools", agent_loop),
+                ("plan every turn + concurrent", always_plan),
+                ("process_query", orchestrator.process_query),
+            ):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    func(query)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(f"  {mode:<30} {statistics.median(timings) * 1000:8.0f} ms  (median of {options['repeat']})")
+            self.stdout.write(f"  process_query metadata: {orchestrator.last_metadata}\n")
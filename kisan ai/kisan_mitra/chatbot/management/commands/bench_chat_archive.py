@@ -0,0 +1,211 @@
+import random
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+from chatbot.models import ChatSession, ChatMessage, ChatSessionArchive
+from chatbot.retention import archive_sessions
+from chatbot.views import get_chat_history
+from users.models import User
+
+QUESTIONS = [
+    "price of wheat 4000{n:02d}", "gehun ka bhav kya hai", "weather 1100{n:02d}", "aaj ka mausam kaisa rahega",
+    "recommend crop N={n} P=42 K=43 temperature 20.8 humidity 82 ph 6.5 rainfall 202.9",
+    "my tomato leaves have brown spots, what do I do", "should I sell my rice now or wait",
+]
+ANSWERS = [
+    "The modal price of wheat at the nearest mandi is Rs {n}50 per quintal (min Rs {n}00, max Rs {n}90).",
+    "Expect light rain over the next two days with a high of {n} C; hold off on spraying until Thursday.",
+    "Based on your soil values, rice is the best fit, followed by maize. Ensure {n} mm of irrigation per week.",
+    "Brown spots with yellow halos usually point to early blight. Remove affected leaves and spray mancozeb at 2.5 g per litre.",
+]
+SEED_CHUNK = 10000
+BENCH_USER_PREFIX = 'bench_chat_' # every seeded session belongs to one of these users; nothing else is touched
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def table_bytes(model):
+    """On-disk size of a model's table including its indexes, or None if the backend can't say."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            return cursor.fetchone()[0]
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "SELECT SUM(d.pgsize) FROM dbstat d JOIN sqlite_master m ON m.name = d.name WHERE m.tbl_name = %s", [table]
+                )
+            except Exception:
+                return None # SQLite built without the dbstat virtual table
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+def is_test_database():
+    return settings.DEBUG or str(connection.settings_dict.get('NAME') or '').rsplit('/', 1)[-1].startswith('test')
+
+
+def bench_sessions():
+    return ChatSession.objects.filter(user__username__startswith=BENCH_USER_PREFIX)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds chat history for bench_chat_* users, then measures table size and get_chat_history latency "
+        "before and after archiving those sessions. Seeded rows are deleted afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10_000_000, help="Messages to seed (two per chat turn).")
+        parser.add_argument('--per-session', type=int, default=20, help="Messages per seeded session.")
+        parser.add_argument('--old-fraction', type=float, default=0.8, help="Share of seeded sessions older than the retention window.")
+        parser.add_argument('--days', type=int, default=90, help="Retention window used for archival.")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--samples', type=int, default=200, help="get_chat_history calls per measurement.")
+        parser.add_argument('--no-seed', action='store_true', help="Reuse bench_chat_* data kept by an earlier --keep run.")
+        parser.add_argument('--keep', action='store_true', help="Leave the seeded users, sessions and messages in place.")
+        parser.add_argument('--compact', action='store_true', help="VACUUM FULL (Postgres) / VACUUM (SQLite) after archiving so freed space shows up.")
+        parser.add_argument('--allow-non-test-db', action='store_true',
+                            help="Run even though DEBUG is off and the database name doesn't start with 'test'.")
+
+    def handle(self, *args, **options):
+        if not is_test_database() and not options['allow_non_test_db']:
+            raise CommandError(
+                f"Refusing to seed {options['messages']} messages into '{connection.settings_dict.get('NAME')}': "
+                "run with DEBUG on or against a test database, or pass --allow-non-test-db."
+            )
+        try:
+            if not options['no_seed']:
+                self.seed(options['messages'], options['per_session'], options['old_fraction'], options['days'])
+            self.measure(options)
+        finally:
+            if not options['keep']:
+                self.teardown()
+
+    def measure(self, options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old_ids = list(bench_sessions().filter(end_time__lt=cutoff).values_list('id', 'user_id'))
+        recent_ids = list(bench_sessions().filter(end_time__gte=cutoff).values_list('id', 'user_id'))
+        samples = {
+            'old': random.sample(old_ids, min(options['samples'], len(old_ids))),
+            'recent': random.sample(recent_ids, min(options['samples'], len(recent_ids))),
+        }
+
+        self.stdout.write("Before archival:")
+        self.report(samples)
+
+        started = time.perf_counter()
+        counts = archive_sessions(options['days'], options['batch_size'], sessions=bench_sessions())
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"\nArchived {counts['messages']} messages from {counts['sessions']} sessions in {counts['batches']} batches, "
+            f"{elapsed:.1f}s ({counts['messages'] / elapsed if elapsed else 0:.0f} msg/s); "
+            f"{counts['raw_bytes'] / 1e6:.1f} MB JSON -> {counts['packed_bytes'] / 1e6:.1f} MB packed"
+        )
+        if options['compact']:
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(f"VACUUM FULL {ChatMessage._meta.db_table}")
+                elif connection.vendor == 'sqlite':
+                    cursor.execute("VACUUM")
+            self.stdout.write(f"Compacted in {time.perf_counter() - started:.1f}s")
+
+        self.stdout.write("\nAfter archival:")
+        self.report(samples)
+
+    def seed(self, total_messages, per_session, old_fraction, days):
+        session_count = max(total_messages // per_session, 1)
+        users = [
+            User(username=f"{BENCH_USER_PREFIX}{i}", user_type='farmer')
+            for i in range(max(session_count // 50, 1))
+        ]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        user_ids = list(User.objects.filter(username__startswith=BENCH_USER_PREFIX).values_list('id', flat=True))
+
+        started = time.perf_counter()
+        session_ids = []
+        for start in range(0, session_count, SEED_CHUNK):
+            chunk = [
+                ChatSession(user_id=user_ids[i % len(user_ids)], title=f"Bench session {i}")
+                for i in range(start, min(start + SEED_CHUNK, session_count))
+            ]
+            session_ids.extend(session.id for session in ChatSession.objects.bulk_create(chunk))
+        if None in session_ids:
+            # Backends without RETURNING: the chunk was just inserted, newest ids last
+            session_ids = list(bench_sessions().order_by('-id').values_list('id', flat=True)[:session_count])[::-1]
+
+        # start_time is auto_now_add, so age the sessions afterwards with update()
+        now = timezone.now()
+        old_count = int(session_count * old_fraction)
+        for start in range(0, old_count, SEED_CHUNK):
+            ids = session_ids[start:min(start + SEED_CHUNK, old_count)]
+            ChatSession.objects.filter(id__in=ids).update(start_time=now - timedelta(days=days + 30), end_time=now - timedelta(days=days + 29))
+        for start in range(old_count, session_count, SEED_CHUNK):
+            ids = session_ids[start:start + SEED_CHUNK]
+            ChatSession.objects.filter(id__in=ids).update(end_time=now)
+
+        rng = random.Random(0)
+        buffer, written = [], 0
+        for session_id in session_ids:
+            for turn in range(per_session // 2):
+                n = rng.randint(10, 99)
+                buffer.append(ChatMessage(session_id=session_id, sender='user', message=rng.choice(QUESTIONS).format(n=n)))
+                buffer.append(ChatMessage(
+                    session_id=session_id, sender='ai', message=rng.choice(ANSWERS).format(n=n),
+                    metadata={'path': rng.choice(['fast', 'agent']), 'latency_ms': round(rng.uniform(5, 4000), 1)},
+                ))
+            if len(buffer) >= SEED_CHUNK:
+                ChatMessage.objects.bulk_create(buffer)
+                written += len(buffer)
+                buffer = []
+                if written % 1_000_000 < SEED_CHUNK:
+                    self.stdout.write(f"  seeded {written} messages...")
+        if buffer:
+            ChatMessage.objects.bulk_create(buffer)
+            written += len(buffer)
+        self.stdout.write(f"Seeded {written} messages in {session_count} sessions ({time.perf_counter() - started:.0f}s)\n")
+
+    def teardown(self):
+        """Deletes everything seeded for bench_chat_* users, a chunk of sessions at a time."""
+        started = time.perf_counter()
+        session_ids = list(bench_sessions().values_list('id', flat=True))
+        for start in range(0, len(session_ids), SEED_CHUNK):
+            chunk = session_ids[start:start + SEED_CHUNK]
+            # Leaf tables first so each DELETE is a single statement without cascade collection
+            ChatMessage.objects.filter(session_id__in=chunk).delete()
+            ChatSessionArchive.objects.filter(session_id__in=chunk).delete()
+            ChatSession.objects.filter(id__in=chunk).delete()
+        User.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+        self.stdout.write(f"\nRemoved {len(session_ids)} seeded sessions and their users ({time.perf_counter() - started:.0f}s)")
+
+    def report(self, samples):
+        for model in (ChatMessage, ChatSessionArchive):
+            size = table_bytes(model)
+            rows = model.objects.count()
+            self.stdout.write(f"  {model._meta.db_table:<28} {rows:>10} rows  {f'{size / 1e6:.1f} MB' if size is not None else 'size n/a':>12}")
+
+        factory = RequestFactory()
+        users = {user.id: user for user in User.objects.filter(id__in={user_id for group in samples.values() for _, user_id in group})}
+        for label, group in samples.items():
+            if not group:
+                continue
+            timings = []
+            for session_id, user_id in group:
+                request = factory.get(f'/chat/history/{session_id}/')
+                request.user = users[user_id]
+                started = time.perf_counter()
+                get_chat_history(request, session_id)
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(
+                f"  get_chat_history ({label:<6} sessions, n={len(timings)}): "
+                f"p50 {percentile(timings, 0.5) * 1000:.2f} ms, p95 {percentile(timings, 0.95) * 1000:.2f} ms"
+            )
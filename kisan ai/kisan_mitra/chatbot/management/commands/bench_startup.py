@@ -0,0 +1,89 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter per measurement so nothing is already imported
+CHILD_SCRIPT = """
+import json, resource, time
+started = time.perf_counter()
+import django
+django.setup()
+import chatbot.views
+booted = time.perf_counter()
+if {first_chat}:
+    from chatbot.agents import load_langchain
+    load_langchain()
+finished = time.perf_counter()
+print(json.dumps({{
+    'boot_s': booted - started,
+    'first_chat_s': finished - booted,
+    'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, # KB on Linux
+}}))
+"""
+
+SCENARIOS = {
+    # name: (CHATBOT_PRELOAD, load LangChain after boot)
+    'lazy': ('False', False),            # what manage.py / tests pay
+    'lazy+first_chat': ('False', True),  # lazy worker, then the first chat request
+    'preload': ('True', False),          # web worker with the ready() preload hook
+}
+
+
+def parse_importtime(stderr, top):
+    """Sums `-X importtime` self times and returns the slowest top-level packages by cumulative time."""
+    total_us = 0
+    packages = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        if not name.startswith('  '): # only depth-0 imports; nested ones are inside their parent's cumulative
+            packages.append((int(cumulative_us), name.strip()))
+    packages.sort(reverse=True)
+    return total_us / 1e6, packages[:top]
+
+
+class Command(BaseCommand):
+    help = "Measures cold-start import time and resident memory of a worker, lazy vs preloaded chatbot."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=8, help="Slowest top-level imports to list per scenario.")
+
+    def run_child(self, preload, first_chat):
+        env = dict(os.environ, CHATBOT_PRELOAD=preload)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'kisan_mitra.settings')
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT.format(first_chat=first_chat)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            errors = [line for line in proc.stderr.splitlines() if not line.startswith('import time:')]
+            raise RuntimeError(errors[-1] if errors else f"exit code {proc.returncode}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result['import_s'], result['top_imports'] = parse_importtime(proc.stderr, self.top)
+        return result
+
+    def handle(self, *args, **options):
+        self.top = options['top']
+        for name, (preload, first_chat) in SCENARIOS.items():
+            try:
+                runs = [self.run_child(preload, first_chat) for _ in range(options['repeat'])]
+            except RuntimeError as e:
+                self.stdout.write(f"{name:<16} failed: {e}")
+                continue
+            boot = statistics.median(r['boot_s'] for r in runs)
+            first = statistics.median(r['first_chat_s'] for r in runs)
+            imports = statistics.median(r['import_s'] for r in runs)
+            rss = statistics.median(r['maxrss_mb'] for r in runs)
+            self.stdout.write(
+                f"{name:<16} boot {boot * 1000:8.1f} ms  first chat +{first * 1000:8.1f} ms  "
+                f"imports {imports * 1000:8.1f} ms  max RSS {rss:7.1f} MB  (median of {len(runs)})"
+            )
+            for cumulative_us, package in runs[-1]['top_imports']:
+                self.stdout.write(f"    {cumulative_us / 1000:8.1f} ms  {package}")
@@ -0,0 +1,77 @@
+import statistics
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chatbot.models import ChatMessage
+from chatbot.router import IntentRouter
+
+SAMPLE_QUERIES = [
+    "price of wheat", "wheat price 400001", "gehun ka bhav", "गेहूं का भाव क्या है", "tomato rate in mandi",
+    "chawal ka daam", "weather 110001", "aaj ka mausam", "मौसम कैसा रहेगा 400001",
+    "recommend crop N=90 P=42 K=43 temperature 20.8 humidity 82 ph 6.5 rainfall 202.9",
+    "recommend_crop(90, 42, 43, 20.8, 82, 6.5, 202.9)",
+    "which crop should I grow?", "what should I plant and what will it fetch",
+    "should I sell my wheat now or wait for the price to rise next month",
+    "price of wheat and rice", "my tomato leaves have brown spots, what do I do",
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Reports the intent router's bypass rate and the latency gap between the fast path and the agent path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help="Window of logged chat traffic to report on.")
+        parser.add_argument('--sample', action='store_true', help="Classify the built-in sample queries (or --file) instead of logged traffic.")
+        parser.add_argument('--file', help="Queries to classify with --sample, one per line.")
+
+    def handle(self, *args, **options):
+        if options['sample']:
+            self.report_sample(options['file'])
+        else:
+            self.report_traffic(options['days'])
+
+    def report_sample(self, path):
+        queries = SAMPLE_QUERIES
+        if path:
+            with open(path, encoding='utf-8') as f:
+                queries = [line.strip() for line in f if line.strip()]
+        router = IntentRouter()
+        timings, bypassed = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            route = router.route(query, user_pin_code='110001')
+            timings.append(time.perf_counter() - started)
+            accepted = router.accepts(route)
+            bypassed += accepted
+            self.stdout.write(f"{'FAST ' if accepted else 'AGENT'}  {query[:60]:<60}  {route!r}")
+        self.stdout.write(
+            f"\nBypass rate {bypassed / len(queries):.0%} of {len(queries)} queries; "
+            f"routing p50 {percentile(timings, 0.5) * 1e6:.0f} µs, p95 {percentile(timings, 0.95) * 1e6:.0f} µs"
+        )
+
+    def report_traffic(self, days):
+        since = timezone.now() - timedelta(days=days)
+        latencies = {'fast': [], 'agent': []}
+        rows = ChatMessage.objects.filter(sender='ai', timestamp__gte=since, metadata__path__in=list(latencies)).values_list('metadata', flat=True)
+        for metadata in rows.iterator():
+            latencies[metadata['path']].append(metadata['latency_ms'])
+        total = sum(len(values) for values in latencies.values())
+        if not total:
+            self.stdout.write(f"No routed chat messages in the last {days} days.")
+            return
+        self.stdout.write(f"Last {days} days: {total} answers, bypass rate {len(latencies['fast']) / total:.1%}")
+        for path, values in latencies.items():
+            if values:
+                self.stdout.write(
+                    f"  {path:<6} n={len(values):<7} mean {statistics.mean(values):9.1f} ms  "
+                    f"p50 {percentile(values, 0.5):9.1f} ms  p95 {percentile(values, 0.95):9.1f} ms"
+                )
+        if latencies['fast'] and latencies['agent']:
+            gap = statistics.median(latencies['agent']) - statistics.median(latencies['fast'])
+            self.stdout.write(f"  median latency gap (agent - fast): {gap:.1f} ms")
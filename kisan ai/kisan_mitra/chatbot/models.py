@@ -6,6 +6,13 @@ class ChatSession(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
     title = models.CharField(max_length=100, blank=True) # AI can summarize/title the chat
+    archived_at = models.DateTimeField(null=True, blank=True) # Set once older messages were moved to ChatSessionArchive
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-start_time']), # sidebar listing
+            models.Index(fields=['end_time']), # retention scan
+        ]
 
     def __str__(self):
         return f"Chat Session {self.id} with {self.user.username}"
@@ -18,5 +25,22 @@ class ChatMessage(models.Model):
     # Optional: If you want to store tool calls or specific agent invoked
     metadata = models.JSONField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'timestamp']), # get_chat_history reads a session in order
+        ]
+
+    def __str__(self):
+        return f"{self.sender}: {self.message[:50]}"
+
+class ChatSessionArchive(models.Model):
+    # Compressed copy of an old session's messages (see chatbot/retention.py): zlib-packed
+    # JSON lines, one per message, replacing the session's ChatMessage rows.
+    session = models.OneToOneField(ChatSession, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    messages_blob = models.BinaryField()
+    message_count = models.PositiveIntegerField(default=0)
+    raw_bytes = models.PositiveIntegerField(default=0) # uncompressed size, for reporting
+    archived_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"{self.sender}: {self.message[:50]}"
\ No newline at end of file
+        return f"Archive of session {self.session_id} ({self.message_count} messages)"
\ No newline at end of file
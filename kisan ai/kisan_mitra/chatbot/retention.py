@@ -0,0 +1,136 @@
+"""
+Retention and archival for chat history.
+
+Every chat turn writes two ChatMessage rows and touches its ChatSession, so the
+message table only ever grows. Sessions with no activity for
+CHAT_RETENTION_DAYS are archived: their messages are packed into one
+zlib-compressed JSON-lines blob (ChatSessionArchive, one row per session) and
+the ChatMessage rows are deleted. The session row itself stays, so the sidebar
+and get_chat_history keep working; chat_history_messages() reads the archive
+and any newer live messages transparently.
+
+archive_sessions() works in small keyset-paginated batches, each in its own
+short transaction, and only locks the session rows of the batch it is working
+on (skipping rows another worker holds), so chat traffic on the hot tables is
+never blocked for long. Run it through the 'maintenance' queue
+(chatbot.tasks.archive_old_chat_sessions) or `python manage.py archive_chats`.
+"""
+import json
+import time
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .models import ChatSession, ChatMessage, ChatSessionArchive
+
+ARCHIVED_FIELDS = ('sender', 'message', 'timestamp', 'metadata')
+DELETE_CHUNK = 5000 # message ids per DELETE statement
+COMPRESSION_LEVEL = 6
+
+
+def pack_messages(rows):
+    """zlib-compressed JSON lines; timestamps are encoded exactly like JsonResponse encodes them."""
+    raw = ''.join(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+    return zlib.compress(raw, COMPRESSION_LEVEL), len(raw)
+
+
+def unpack_messages(blob):
+    raw = zlib.decompress(bytes(blob)).decode('utf-8')
+    return [json.loads(line) for line in raw.splitlines() if line]
+
+
+def archived_messages(session):
+    """Messages of `session` that were moved to its archive, oldest first ([] if it has none)."""
+    # The archive row is the source of truth; archived_at on an in-memory session can be stale
+    blob = ChatSessionArchive.objects.filter(session_id=session.id).values_list('messages_blob', flat=True).first()
+    return unpack_messages(blob) if blob is not None else []
+
+
+def chat_history_messages(session, fields=('sender', 'message', 'timestamp')):
+    """Full history of `session` in order: archived messages, then anything written since archival."""
+    archived = [{field: row.get(field) for field in fields} for row in archived_messages(session)]
+    live = list(session.messages.order_by('timestamp', 'id').values(*fields))
+    if not archived:
+        return live
+    # Encode live timestamps the way the archive stored them so the list is uniform
+    return archived + json.loads(json.dumps(live, cls=DjangoJSONEncoder))
+
+
+def sessions_due_for_archival(cutoff, sessions=None):
+    """Sessions (of `sessions`, default all) idle since before `cutoff` that still have rows in ChatMessage."""
+    idle = Q(end_time__lt=cutoff) | Q(end_time__isnull=True, start_time__lt=cutoff)
+    has_messages = Exists(ChatMessage.objects.filter(session_id=OuterRef('pk')))
+    return (sessions if sessions is not None else ChatSession.objects.all()).filter(idle).filter(has_messages)
+
+
+def _archive_batch(session_ids):
+    """Moves the messages of `session_ids` into their archives. Returns (sessions, messages, raw_bytes, packed_bytes)."""
+    with transaction.atomic():
+        # NO KEY UPDATE: new ChatMessage inserts (FOR KEY SHARE on the session) are not blocked
+        ids = list(
+            ChatSession.objects.select_for_update(skip_locked=True, no_key=True)
+            .filter(id__in=session_ids).values_list('id', flat=True)
+        )
+        if not ids:
+            return 0, 0, 0, 0
+
+        rows_by_session = {session_id: [] for session_id in ids}
+        message_ids = []
+        for row in ChatMessage.objects.filter(session_id__in=ids).order_by('session_id', 'timestamp', 'id').values('id', 'session_id', *ARCHIVED_FIELDS).iterator(chunk_size=DELETE_CHUNK):
+            message_ids.append(row.pop('id'))
+            rows_by_session[row.pop('session_id')].append(row)
+
+        # Sessions archived before and resumed since get their new messages appended. Look for an
+        # archive whatever archived_at says, or the upsert below would overwrite the old messages.
+        existing = dict(ChatSessionArchive.objects.filter(session_id__in=ids).values_list('session_id', 'messages_blob'))
+
+        archives, raw_total, packed_total = [], 0, 0
+        for session_id, rows in rows_by_session.items():
+            if not rows:
+                continue
+            if session_id in existing:
+                rows = unpack_messages(existing[session_id]) + rows
+            blob, raw_bytes = pack_messages(rows)
+            archives.append(ChatSessionArchive(session_id=session_id, messages_blob=blob, message_count=len(rows), raw_bytes=raw_bytes))
+            raw_total += raw_bytes
+            packed_total += len(blob)
+
+        ChatSessionArchive.objects.bulk_create(
+            archives, update_conflicts=True, unique_fields=['session'],
+            update_fields=['messages_blob', 'message_count', 'raw_bytes', 'archived_at'],
+        )
+        # Delete exactly what was packed; a message written mid-batch stays live for the next run
+        for start in range(0, len(message_ids), DELETE_CHUNK):
+            ChatMessage.objects.filter(id__in=message_ids[start:start + DELETE_CHUNK]).delete() # no dependents: one DELETE each
+        ChatSession.objects.filter(id__in=[archive.session_id for archive in archives]).update(archived_at=timezone.now())
+    return len(archives), len(message_ids), raw_total, packed_total
+
+
+def archive_sessions(older_than_days=None, batch_size=None, max_batches=None, pause=0, sessions=None):
+    """
+    Archives every session idle for `older_than_days`, optionally only those in the `sessions`
+    queryset. Returns counts for logging/benchmarks.
+    """
+    older_than_days = older_than_days if older_than_days is not None else getattr(settings, 'CHAT_RETENTION_DAYS', 90)
+    batch_size = batch_size or getattr(settings, 'CHAT_ARCHIVE_BATCH_SIZE', 200)
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    counts = {'batches': 0, 'sessions': 0, 'messages': 0, 'raw_bytes': 0, 'packed_bytes': 0}
+    last_id = 0
+    while max_batches is None or counts['batches'] < max_batches:
+        # Keyset pagination on the primary key: each batch query starts where the last one stopped
+        session_ids = list(sessions_due_for_archival(cutoff, sessions).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not session_ids:
+            break
+        last_id = session_ids[-1]
+        archived, messages, raw_bytes, packed_bytes = _archive_batch(session_ids)
+        counts['batches'] += 1
+        counts['sessions'] += archived
+        counts['messages'] += messages
+        counts['raw_bytes'] += raw_bytes
+        counts['packed_bytes'] += packed_bytes
+        if pause:
+            time.sleep(pause) # give replication/autovacuum room between batches
+    return counts
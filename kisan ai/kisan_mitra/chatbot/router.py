@@ -0,0 +1,187 @@
+"""
+Deterministic fast path in front of the LLM agent.
+
+Most chat traffic is a plain lookup ("price of wheat", "weather 110001",
+"gehun ka bhav", soil numbers for a crop recommendation). IntentRouter
+classifies those with precompiled keyword/regex patterns, fills the tool's
+arguments from the text (crop names in English, Hinglish or Devanagari,
+pincodes, N/P/K/... values) and reports a confidence. The orchestrator calls
+the tool directly when the confidence clears CHATBOT_ROUTER_MIN_CONFIDENCE and
+falls back to the Gemini agent otherwise, e.g. for multi-intent or advisory
+questions ("should I sell my wheat now?").
+"""
+import re
+import threading
+from django.conf import settings
+
+# canonical name -> synonyms (English, Hinglish, Devanagari)
+CROP_SYNONYMS = {
+    'wheat': ['wheat', 'gehun', 'gehu', 'gehoon', 'गेहूं', 'गेहूँ', 'गेंहू'],
+    'rice': ['rice', 'paddy', 'chawal', 'chaawal', 'dhan', 'dhaan', 'चावल', 'धान'],
+    'tomato': ['tomato', 'tomatoes', 'tamatar', 'टमाटर'],
+    'potato': ['potato', 'potatoes', 'aloo', 'alu', 'आलू'],
+    'onion': ['onion', 'onions', 'pyaz', 'pyaaz', 'kanda', 'प्याज'],
+    'maize': ['maize', 'corn', 'makka', 'makki', 'मक्का'],
+    'cotton': ['cotton', 'kapas', 'कपास'],
+    'sugarcane': ['sugarcane', 'ganna', 'गन्ना'],
+    'mustard': ['mustard', 'sarson', 'सरसों'],
+    'soybean': ['soybean', 'soyabean', 'soya', 'सोयाबीन'],
+    'chickpea': ['chickpea', 'chickpeas', 'chana', 'चना'],
+}
+
+PRICE_WORDS = ['price', 'prices', 'rate', 'rates', 'bhav', 'bhaav', 'daam', 'dam', 'keemat', 'kimat', 'mandi', 'भाव', 'दाम', 'कीमत', 'मंडी', 'रेट']
+WEATHER_WORDS = ['weather', 'forecast', 'temperature', 'humidity', 'mausam', 'mosam', 'baarish', 'barish', 'मौसम', 'बारिश', 'तापमान']
+RECOMMEND_WORDS = ['recommend', 'recommendation', 'suggest', 'which crop', 'what crop', 'what should i grow', 'what should i plant',
+                   'what should i sow', 'kaunsi fasal', 'konsi fasal', 'kya ugaye', 'kya ugau', 'फसल', 'सुझाव']
+# Advisory or reasoning questions need the agent even if a lookup keyword is present
+ADVISORY_WORDS = ['why', 'should', 'how to', 'how do', 'how can', 'when', 'compare', 'better', 'kyun', 'kyon', 'kaise', 'kab', 'chahiye', 'क्यों', 'कैसे', 'कब', 'चाहिए']
+
+SOIL_SLOTS = {
+    'N': ['n', 'nitrogen'],
+    'P': ['p', 'phosphorus', 'phosphorous'],
+    'K': ['k', 'potassium'],
+    'temperature': ['temperature', 'temp'],
+    'humidity': ['humidity'],
+    'ph': ['ph'],
+    'rainfall': ['rainfall', 'rain'],
+}
+NUMBER = r'(\d+(?:\.\d+)?)'
+
+
+def _alternation(words):
+    """Regex for any of `words`; ASCII words need word boundaries, Devanagari ones can't use \\b reliably."""
+    ascii_words = sorted((w for w in words if w.isascii()), key=len, reverse=True)
+    other_words = sorted((w for w in words if not w.isascii()), key=len, reverse=True)
+    parts = []
+    if ascii_words:
+        parts.append(r'(?<![a-z])(?:' + '|'.join(re.escape(w) for w in ascii_words) + r')(?![a-z])')
+    if other_words:
+        parts.append('(?:' + '|'.join(re.escape(w) for w in other_words) + ')')
+    return re.compile('|'.join(parts), re.IGNORECASE)
+
+
+PRICE_RE = _alternation(PRICE_WORDS)
+WEATHER_RE = _alternation(WEATHER_WORDS)
+RECOMMEND_RE = _alternation(RECOMMEND_WORDS)
+ADVISORY_RE = _alternation(ADVISORY_WORDS)
+PINCODE_RE = re.compile(r'(?<!\d)([1-9]\d{5})(?!\d)')
+URL_RE = re.compile(r'https?://\S+', re.IGNORECASE) # crop photos arrive as links for analyze_crop_image
+NUMBERS_RE = re.compile(r'(?<![\w.])' + NUMBER + r'(?![\w.])')
+CROP_PATTERNS = [(crop, _alternation(synonyms)) for crop, synonyms in CROP_SYNONYMS.items()]
+SOIL_PATTERNS = {
+    slot: re.compile(r'(?<![a-z])(?:' + '|'.join(names) + r')\s*(?:[:=]|is|of)?\s*' + NUMBER, re.IGNORECASE)
+    for slot, names in SOIL_SLOTS.items()
+}
+
+MAX_LOOKUP_WORDS = 10 # longer messages usually carry context the agent should see
+
+
+class Route:
+    def __init__(self, intent, tool=None, args=None, confidence=0.0, reason=''):
+        self.intent = intent
+        self.tool = tool
+        self.args = args or {}
+        self.confidence = confidence
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Route({self.intent}, {self.tool}, {self.args}, confidence={self.confidence:.2f}, {self.reason!r})"
+
+
+class IntentRouter:
+    def __init__(self, min_confidence=None):
+        self.min_confidence = min_confidence if min_confidence is not None else getattr(settings, 'CHATBOT_ROUTER_MIN_CONFIDENCE', 0.8)
+
+    def accepts(self, route):
+        return route.tool is not None and route.confidence >= self.min_confidence
+
+    def may_need_tools(self, route, query):
+        """False when no tool can help (no lookup keyword and no image link), so the agent can skip tool planning."""
+        return route.intent != 'unknown' or bool(URL_RE.search(query))
+
+    def route(self, query, user_pin_code=None):
+        """Classifies `query`; returns a Route (check accepts() before calling its tool)."""
+        text = query.strip()
+        # "temperature 20.8" is a soil/climate slot, not a weather request
+        intent_text = text
+        for pattern in SOIL_PATTERNS.values():
+            intent_text = pattern.sub(' ', intent_text)
+        intents = [
+            intent for intent, pattern in (('price', PRICE_RE), ('weather', WEATHER_RE), ('recommend', RECOMMEND_RE))
+            if pattern.search(intent_text)
+        ]
+        if len(intents) != 1:
+            return Route('multi' if intents else 'unknown', reason=f"matched intents: {intents}")
+        intent = intents[0]
+
+        # Lookup phrasing gets full confidence; long or advisory messages are shaded down for the agent
+        confidence = 1.0
+        if ADVISORY_RE.search(text):
+            confidence -= 0.4
+        if len(text.split()) > MAX_LOOKUP_WORDS and intent != 'recommend':
+            confidence -= 0.3
+        pincodes = PINCODE_RE.findall(text)
+
+        if intent == 'price':
+            crops = [crop for crop, pattern in CROP_PATTERNS if pattern.search(text)]
+            if len(crops) != 1:
+                return Route(intent, reason=f"need exactly one crop, found {crops}")
+            args = {'crop_name': crops[0]}
+            pin_code = pincodes[0] if pincodes else user_pin_code
+            if pin_code:
+                args['location_pin_code'] = pin_code
+            return Route(intent, 'get_market_prices', args, confidence)
+
+        if intent == 'weather':
+            pin_code = pincodes[0] if pincodes else user_pin_code
+            if not pin_code:
+                return Route(intent, reason="no pincode")
+            return Route(intent, 'get_weather_forecast', {'pin_code': pin_code}, confidence)
+
+        # recommend: all seven soil/climate values are required
+        args = {}
+        for slot, pattern in SOIL_PATTERNS.items():
+            match = pattern.search(text)
+            if match:
+                args[slot] = float(match.group(1))
+        if len(args) < len(SOIL_SLOTS):
+            # Positional form, e.g. "recommend crop 90 42 43 20.8 82 6.5 202.9"; a pincode is never a soil value
+            numbers = NUMBERS_RE.findall(PINCODE_RE.sub(' ', text))
+            if len(numbers) != len(SOIL_SLOTS):
+                return Route(intent, reason=f"missing soil values: {sorted(set(SOIL_SLOTS) - set(args))}")
+            args = dict(zip(SOIL_SLOTS, map(float, numbers)))
+        return Route(intent, 'recommend_crop', args, confidence)
+
+
+class RouterStats:
+    """Thread-safe bypass and latency counters for the fast path vs the agent path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {path: {'count': 0, 'latency_total': 0.0} for path in ('fast', 'agent')}
+
+    def record(self, path, latency):
+        with self._lock:
+            self._stats[path]['count'] += 1
+            self._stats[path]['latency_total'] += latency
+
+    def snapshot(self):
+        with self._lock:
+            fast, agent = self._stats['fast'], self._stats['agent']
+            total = fast['count'] + agent['count']
+            fast_avg = fast['latency_total'] / fast['count'] if fast['count'] else 0.0
+            agent_avg = agent['latency_total'] / agent['count'] if agent['count'] else 0.0
+            return {
+                'queries': total,
+                'bypass_rate': fast['count'] / total if total else 0.0,
+                'fast_avg_s': fast_avg,
+                'agent_avg_s': agent_avg,
+                'latency_gap_s': agent_avg - fast_avg if fast['count'] and agent['count'] else None,
+            }
+
+
+router_stats = RouterStats()
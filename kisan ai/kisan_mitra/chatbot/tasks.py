@@ -0,0 +1,11 @@
+import logging
+from marketplace.task_runner import task
+from .retention import archive_sessions
+
+logger = logging.getLogger(__name__)
+
+
+@task(queue='maintenance', dedup=True) # Scheduled daily by run_tasks (TASK_RUNNER['CHAT_ARCHIVE_INTERVAL'])
+def archive_old_chat_sessions():
+    counts = archive_sessions()
+    logger.info(f"Chat archival: {counts}")
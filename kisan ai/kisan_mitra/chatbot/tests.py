@@ -1,3 +1,206 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from users.models import User
+from .models import ChatSession, ChatMessage, ChatSessionArchive
+from .retention import archive_sessions, chat_history_messages, pack_messages, unpack_messages
+from .agents import KisanMitraOrchestrator
+from .router import IntentRouter
+from .tool_runner import ParallelToolRunner, ToolCall
 
-# Create your tests here.
+
+class LazyLangChainTests(SimpleTestCase):
+    def test_importing_views_does_not_import_langchain(self):
+        # Fresh interpreter: this test process may already have LangChain loaded by other tests
+        script = (
+            "import sys, django; django.setup(); import chatbot.views; "
+            "print(','.join(sorted(name for name in sys.modules if name.startswith('langchain'))))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=120,
+            env={**os.environ, 'CHATBOT_PRELOAD': 'False'},
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
+
+
+class IntentRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = IntentRouter(min_confidence=0.8)
+
+    def test_lookups_take_the_fast_path(self):
+        route = self.router.route("gehun ka bhav 400001")
+        self.assertTrue(self.router.accepts(route))
+        self.assertEqual((route.tool, route.args), ('get_market_prices', {'crop_name': 'wheat', 'location_pin_code': '400001'}))
+        self.assertEqual(self.router.route("aaj ka mausam", user_pin_code='110001').args, {'pin_code': '110001'})
+
+    def test_positional_soil_values_ignore_pincodes(self):
+        route = self.router.route("recommend crop for my farm at 110001: 90 42 43 20.8 82 6.5")
+        self.assertFalse(self.router.accepts(route))
+        route = self.router.route("recommend crop 90 42 43 20.8 82 6.5 202.9 for 110001")
+        self.assertTrue(self.router.accepts(route))
+        self.assertEqual(route.args['N'], 90.0)
+
+    def test_advisory_questions_go_to_the_agent(self):
+        self.assertFalse(self.router.accepts(self.router.route("should I sell my wheat now or wait for the price to rise")))
+
+
+def prices(crop_name, location_pin_code=None):
+    return f"{crop_name} price"
+
+
+def weather(pin_code):
+    return f"weather at {pin_code}"
+
+
+def empty_forecast(pin_code):
+    return [][0]
+
+
+class ParallelToolRunnerTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+        def hung(pin_code):
+            self.release.wait(5)
+            return "too late"
+
+        self.tools = {'get_market_prices': prices, 'get_weather_forecast': weather, 'hung': hung, 'broken': empty_forecast}
+        self.runner = ParallelToolRunner(self.tools, timeouts={'hung': 0.05})
+
+    def test_results_come_back_in_call_order(self):
+        calls = [ToolCall('get_weather_forecast', {'pin_code': '110001'}), ToolCall('get_market_prices', {'crop_name': 'wheat'})]
+        self.assertEqual([result for _, result in self.runner.run(calls)], ["weather at 110001", "wheat price"])
+
+    def test_errors_are_returned_as_text(self):
+        [(_, result)] = self.runner.run([ToolCall('broken', {'pin_code': '110001'})])
+        self.assertEqual(result, "Error running broken: list index out of range")
+
+    def test_slow_tool_times_out_without_holding_up_the_rest(self):
+        started = time.monotonic()
+        results = self.runner.run([ToolCall('hung', {'pin_code': '110001'}), ToolCall('get_market_prices', {'crop_name': 'rice'})])
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual([result for _, result in results], ["hung timed out after 0.05s; no result available.", "rice price"])
+
+    def test_parse_plan_drops_malformed_and_unknown_entries(self):
+        self.assertEqual(self.runner.parse_plan("no tools needed"), [])
+        self.assertEqual(self.runner.parse_plan('[{"tool": "get_market_prices", "args": {"crop_name": }]'), [])
+        calls = self.runner.parse_plan(
+            'Plan: [{"tool": "get_market_prices", "args": {"crop_name": "wheat"}},'
+            ' {"tool": "sell_crop", "args": {}},'
+            ' {"tool": "get_weather_forecast", "args": {"pincode": "110001"}},'
+            ' {"tool": "get_weather_forecast", "args": ["110001"]},'
+            ' {"tool": "get_market_prices", "args": {"crop_name": "wheat"}},'
+            ' {"tool": "get_weather_forecast", "args": {"pin_code": "110001"}}]'
+        )
+        self.assertEqual([repr(call) for call in calls], ["get_market_prices(crop_name='wheat')", "get_weather_forecast(pin_code='110001')"])
+
+
+class ToolPlanningTests(SimpleTestCase):
+    def setUp(self):
+        self.orchestrator = KisanMitraOrchestrator()
+        self.orchestrator.tool_runner = ParallelToolRunner({'get_market_prices': prices, 'get_weather_forecast': weather})
+        self.prompts, self.inputs = [], []
+        plan = '[{"tool": "get_market_prices", "args": {"crop_name": "wheat"}}]'
+        self.orchestrator.llm = SimpleNamespace(invoke=lambda prompt: self.prompts.append(prompt) or SimpleNamespace(content=plan))
+        self.orchestrator.agent_executor = SimpleNamespace(invoke=lambda data: self.inputs.append(data['input']) or {'output': "answer"})
+
+    def test_questions_no_tool_can_answer_skip_planning(self):
+        self.assertEqual(self.orchestrator.process_query("how do I control aphids on mustard organically"), "answer")
+        self.assertEqual(self.prompts, [])
+        self.assertFalse(self.orchestrator.last_metadata['planned'])
+
+    def test_multi_intent_questions_plan_and_pass_results_to_the_agent(self):
+        self.orchestrator.process_query("wheat price and weather for 110001")
+        self.assertEqual(len(self.prompts), 1)
+        self.assertIn("get_market_prices(crop_name='wheat'): wheat price", self.inputs[0])
+
+    def test_lookups_take_the_fast_path(self):
+        self.assertEqual(self.orchestrator.process_query("weather 110001"), "weather at 110001")
+        self.assertEqual((self.orchestrator.last_metadata['path'], self.inputs), ('fast', []))
+
+    def test_failed_fast_path_lookup_falls_back_to_the_agent(self):
+        self.orchestrator.tool_runner.tool_functions['get_weather_forecast'] = empty_forecast
+        self.assertEqual(self.orchestrator.process_query("weather 110001"), "answer")
+        self.assertEqual(self.orchestrator.last_metadata['path'], 'agent')
+        self.assertIn("list index out of range", self.orchestrator.last_metadata['fast_path_error'])
+
+
+class ChatArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='farmer')
+        self.session = self.make_session(["price of wheat", "गेहूं का भाव ₹2,275/क्विंटल", "weather 110001", "Light rain expected"])
+        self.recent = self.make_session(["aaj ka mausam"], idle_days=1)
+        self.client.force_login(self.user)
+
+    def make_session(self, texts, idle_days=200):
+        session = ChatSession.objects.create(user=self.user, title=texts[0][:50])
+        for n, text in enumerate(texts):
+            ChatMessage.objects.create(session=session, sender='user' if n % 2 == 0 else 'ai', message=text, metadata={'n': n})
+        ChatSession.objects.filter(id=session.id).update(end_time=timezone.now() - timedelta(days=idle_days))
+        return ChatSession.objects.get(id=session.id)
+
+    def history(self, session):
+        response = self.client.get(reverse('get_chat_history', args=[session.id]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['messages']
+
+    def test_pack_round_trip(self):
+        rows = [{'sender': 'ai', 'message': "नमस्ते\nline two", 'timestamp': timezone.now(), 'metadata': {'path': 'fast'}}]
+        blob, _ = pack_messages(rows)
+        [unpacked] = unpack_messages(blob)
+        self.assertEqual(unpacked['message'], rows[0]['message'])
+        self.assertEqual(unpacked['metadata'], {'path': 'fast'})
+
+    def test_archived_history_reads_the_same(self):
+        before = self.history(self.session)
+        counts = archive_sessions(older_than_days=90)
+
+        self.assertEqual((counts['sessions'], counts['messages']), (1, 4))
+        self.assertFalse(self.session.messages.exists())
+        self.assertEqual(ChatSessionArchive.objects.get(session=self.session).message_count, 4)
+        self.assertEqual(self.history(self.session), before)
+        self.assertEqual(self.recent.messages.count(), 1) # inside the retention window
+
+    def test_resumed_session_is_appended_to_its_archive(self):
+        archive_sessions(older_than_days=90)
+        ChatMessage.objects.create(session=self.session, sender='user', message="and rice?")
+        self.assertEqual([m['message'] for m in self.history(self.session)][-2:], ["Light rain expected", "and rice?"])
+
+        ChatSession.objects.filter(id=self.session.id).update(end_time=timezone.now() - timedelta(days=200))
+        archive_sessions(older_than_days=90)
+        self.assertEqual(ChatSessionArchive.objects.get(session=self.session).message_count, 5)
+        self.assertEqual(len(self.history(self.session)), 5)
+
+    def test_stale_archived_at_does_not_lose_the_archive(self):
+        stale = ChatSession.objects.get(id=self.session.id) # loaded by a request before archival ran
+        archive_sessions(older_than_days=90)
+        stale.save() # writes archived_at=None back
+        ChatMessage.objects.create(session=stale, sender='user', message="still there?")
+        self.assertEqual(len(chat_history_messages(stale)), 5)
+
+        ChatSession.objects.filter(id=stale.id).update(end_time=timezone.now() - timedelta(days=200))
+        archive_sessions(older_than_days=90)
+        self.assertEqual(len(chat_history_messages(ChatSession.objects.get(id=stale.id))), 5)
+
+    def test_archival_can_be_limited_to_some_sessions(self):
+        other = self.make_session(["old question"])
+        archive_sessions(older_than_days=90, sessions=ChatSession.objects.filter(id=other.id))
+        self.assertEqual(self.session.messages.count(), 4)
+        self.assertFalse(other.messages.exists())
+
+    def test_small_batches_cover_every_session(self):
+        for n in range(5):
+            self.make_session([f"question {n}", f"answer {n}"])
+        counts = archive_sessions(older_than_days=90, batch_size=2)
+        self.assertEqual((counts['batches'], counts['sessions']), (3, 6))
+        self.assertEqual(ChatMessage.objects.count(), 1)
@@ -0,0 +1,142 @@
+"""
+Concurrent tool execution for a single agent turn.
+
+The JSON agent calls one tool per LLM step, so "what should I plant and what
+will it fetch" costs weather + prices + recommendation back to back, each
+blocking on I/O, plus an LLM round trip between every call. Instead the
+orchestrator asks the LLM once for every independent call the query needs
+(plan_prompt / parse_plan), runs them all at once on a shared thread pool with
+per-tool timeouts (ParallelToolRunner), and hands the results to the agent as
+context (format_results) so it can usually answer in a single step. Questions
+no tool can help with skip the planning call (IntentRouter.may_need_tools).
+
+A timed-out call is reported to the agent but keeps running: a Python thread
+can't be interrupted, so it holds a pool thread until the tool returns. Tools
+that do I/O must bound it with tool_timeout(name) themselves, e.g. as the
+`requests` timeout, so a hung upstream can't exhaust the pool.
+"""
+import inspect
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10 # seconds, for tools without an entry in settings.CHATBOT_TOOL_TIMEOUTS
+MAX_PLANNED_CALLS = 6
+
+# Shared across requests; tools are I/O bound so threads are enough
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='chat-tool')
+
+
+def tool_timeout(name):
+    """Seconds the runner waits for tool `name`; tools use it to bound their own I/O."""
+    return getattr(settings, 'CHATBOT_TOOL_TIMEOUTS', {}).get(name, DEFAULT_TIMEOUT)
+
+
+class ToolCall:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __repr__(self):
+        args = ', '.join(f"{key}={value!r}" for key, value in self.args.items())
+        return f"{self.name}({args})"
+
+
+class ParallelToolRunner:
+    def __init__(self, tool_functions, timeouts=None, executor=None):
+        self.tool_functions = tool_functions # {name: plain function}
+        self.timeouts = timeouts if timeouts is not None else getattr(settings, 'CHATBOT_TOOL_TIMEOUTS', {})
+        self.executor = executor or _executor
+
+    def timeout_for(self, name):
+        return self.timeouts.get(name, DEFAULT_TIMEOUT)
+
+    def _call(self, call):
+        """(ok, result_text); errors become text for the agent instead of raising."""
+        try:
+            return True, str(self.tool_functions[call.name](**call.args))
+        except Exception as e:
+            return False, f"Error running {call.name}: {e}"
+
+    def run_with_status(self, calls):
+        """Like run(), but returns [(call, ok, result_text)]; ok is False for errors and timeouts."""
+        started = time.monotonic()
+        futures = [(call, self.executor.submit(self._call, call)) for call in calls]
+        results = []
+        for call, future in futures:
+            # Each tool gets its own budget measured from the shared start, not from when we got to it
+            remaining = self.timeout_for(call.name) - (time.monotonic() - started)
+            try:
+                results.append((call, *future.result(timeout=max(remaining, 0))))
+            except FutureTimeoutError:
+                future.cancel() # only drops calls still queued; a running one finishes in the background
+                logger.warning(f"Tool {call!r} timed out after {self.timeout_for(call.name)}s")
+                results.append((call, False, f"{call.name} timed out after {self.timeout_for(call.name)}s; no result available."))
+        return results
+
+    def run(self, calls):
+        """Runs every call concurrently. Returns [(call, result_text)] in call order; never raises."""
+        return [(call, result) for call, _, result in self.run_with_status(calls)]
+
+    def run_sequential(self, calls):
+        """One call after another, the way the agent loop executes them. Used for benchmarking."""
+        return [(call, self._call(call)[1]) for call in calls]
+
+    # --- Planning ---
+
+    def describe_tools(self):
+        lines = []
+        for name, func in self.tool_functions.items():
+            doc = ' '.join((func.__doc__ or '').split())
+            lines.append(f"- {name}{inspect.signature(func)}: {doc}")
+        return '\n'.join(lines)
+
+    def plan_prompt(self, query):
+        return (
+            "You plan tool calls for an agricultural assistant. Available tools:\n"
+            f"{self.describe_tools()}\n\n"
+            "List every tool call that is needed to answer the query below and whose arguments are already "
+            "known from the query (do not guess missing soil values or image URLs). Respond with only a JSON "
+            'array like [{"tool": "get_market_prices", "args": {"crop_name": "wheat"}}], or [] if no tool is needed.\n\n'
+            f"Query: {query}"
+        )
+
+    def parse_plan(self, text):
+        """Validated ToolCalls from the planner's reply; malformed or unknown entries are dropped."""
+        start, end = text.find('['), text.rfind(']')
+        if start == -1 or end <= start:
+            return []
+        try:
+            entries = json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            return []
+        calls = []
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict) or entry.get('tool') not in self.tool_functions:
+                continue
+            args = entry.get('args') or {}
+            if not isinstance(args, dict):
+                continue
+            try:
+                inspect.signature(self.tool_functions[entry['tool']]).bind(**args)
+            except TypeError:
+                continue
+            call = ToolCall(entry['tool'], args)
+            if repr(call) not in {repr(existing) for existing in calls}:
+                calls.append(call)
+        return calls[:MAX_PLANNED_CALLS]
+
+
+def format_results(results):
+    """Tool results as a context block for the agent's input."""
+    if not results:
+        return ""
+    lines = [f"- {call!r}: {result}" for call, result in results]
+    return (
+        "\n\nTool results already gathered for this question (use them directly; "
+        "only call a tool if something essential is still missing):\n" + '\n'.join(lines)
+    )
@@ -4,6 +4,7 @@ from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from .agents import KisanMitraOrchestrator # Your agent import
 from .models import ChatSession, ChatMessage
+from .retention import chat_history_messages
 from django.shortcuts import get_object_or_404, render
 from datetime import datetime
 
@@ -27,7 +28,9 @@ def chat_logger(func):
 
         # Assuming response is a JsonResponse with 'message' key
         ai_response_text = json.loads(response.content).get('message')
-        ChatMessage.objects.create(session=chat_session, sender='ai', message=ai_response_text)
+        # Fast path vs agent, latency etc. (see KisanMitraOrchestrator.last_metadata)
+        metadata = getattr(request, 'chat_metadata', None)
+        ChatMessage.objects.create(session=chat_session, sender='ai', message=ai_response_text, metadata=metadata)
         return response
     return wrapper
 
@@ -42,12 +45,14 @@ def chat_with_ai(request, chat_session, user_message):
         orchestrator = KisanMitraOrchestrator(user_pin_code=user_pin_code)
         
         ai_response = orchestrator.process_query(user_message)
+        request.chat_metadata = orchestrator.last_metadata
 
         # Update session end time and potentially title
         chat_session.end_time = datetime.now()
         if not chat_session.title.startswith("Chat Session"): # Only update if not generic
              chat_session.title = user_message[:50] # Or use a smarter AI summary
-        chat_session.save()
+        # Only these fields: a full save() would write back a stale archived_at if archival ran mid-request
+        chat_session.save(update_fields=['end_time', 'title'])
 
         return JsonResponse({'message': ai_response, 'session_id': chat_session.id})
     return JsonResponse({'error': 'Invalid request method'}, status=405)
@@ -62,7 +67,7 @@ def chat_interface(request):
 @login_required
 def get_chat_history(request, session_id):
     chat_session = get_object_or_404(ChatSession, id=session_id, user=request.user)
-    messages = list(chat_session.messages.order_by('timestamp').values('sender', 'message', 'timestamp'))
+    messages = chat_history_messages(chat_session) # includes messages moved to the archive
     return JsonResponse({'messages': messages, 'session_id': session_id, 'title': chat_session.title})
 
 
@@ -0,0 +1,62 @@
+import math
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from geo.pincodes import get_index, haversine_km, PincodeIndex
+
+
+def python_haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the pincode proximity engine on 1M distance evaluations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--n', type=int, default=1_000_000)
+        parser.add_argument('--synthetic', type=int, default=20_000,
+                            help="Index this many random pincodes instead of the configured table (0 = use the table).")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def timed(self, label, n, func):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        rate = f"  {n / elapsed / 1e6:8.2f} M evals/s" if n else ""
+        self.stdout.write(f"{label:<44} {elapsed * 1000:9.1f} ms{rate}")
+        return result
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        n = options['n']
+
+        if options['synthetic']:
+            # Roughly the size and spread of the India Post directory (~19k pincodes)
+            pins = rng.choice(np.arange(110001, 855118), options['synthetic'], replace=False)
+            index = self.timed("build index", None, lambda: PincodeIndex(pins, rng.uniform(8, 35, len(pins)), rng.uniform(68, 97, len(pins))))
+        else:
+            index = self.timed("load index", None, get_index)
+        self.stdout.write(f"{len(index)} pincodes indexed, {len(index._grid)} grid cells\n")
+
+        a = rng.integers(0, len(index), n)
+        b = rng.integers(0, len(index), n)
+        lat1, lon1, lat2, lon2 = index.lat[a], index.lon[a], index.lat[b], index.lon[b]
+        pins_a = [f"{p:06d}" for p in index.pincodes[a]]
+        pins_b = [f"{p:06d}" for p in index.pincodes[b]]
+
+        self.timed("vectorized haversine (coordinates)", n, lambda: haversine_km(lat1, lon1, lat2, lon2))
+        self.timed("distances_km, 1 origin -> n pincode strings", n, lambda: index.distances_km(pins_a[0], pins_b))
+        self.timed("distances_km, 1 origin -> n int pincodes", n, lambda: index.distances_km(pins_a[0], index.pincodes[b]))
+        side = int(math.sqrt(n))
+        self.timed(f"distance_matrix {side}x{side}", side * side, lambda: index.distance_matrix(pins_a[:side], pins_b[:side]))
+        self.timed("pure-python haversine loop", n, lambda: [python_haversine_km(*args) for args in zip(lat1.tolist(), lon1.tolist(), lat2.tolist(), lon2.tolist())])
+        self.timed("old abs(int(pin1) - int(pin2)) < 100 loop", n, lambda: [abs(int(p) - int(q)) < 100 for p, q in zip(pins_a, pins_b)])
+
+        queries = 1000
+        for radius in (25, 50, 100):
+            started = time.perf_counter()
+            found = sum(len(index.within_radius(pin, radius)) for pin in pins_a[:queries])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"within_radius {radius:>3} km x {queries}{'':<18} {elapsed * 1000:9.1f} ms  {found / queries:8.1f} hits/query")
@@ -0,0 +1,277 @@
+"""
+Pincode proximity engine.
+
+Replaces the old `abs(int(pin1) - int(pin2)) < 100` heuristic with real
+great-circle distances between pincode centroids. The centroid table is read
+once per process into compact numpy arrays (sorted int32 pincodes, float64
+coordinates) so single lookups are a binary search and bulk work is
+vectorized.
+
+The bundled table (data/pincode_centroids.csv) has one centroid for each of
+the ~19.5k pincodes in the India Post all-India pincode directory: the median
+of its post offices' coordinates, with missing and out-of-India points
+dropped. Point settings.GEO_PINCODE_CSV at another file with the same columns
+(pincode, latitude, longitude; one row per post office is fine) to override
+it. Pincodes missing from the table resolve to the centroid of their 3-digit
+sorting district, then of their 2-digit postal region. That is close enough
+for display and weather, but two such fallbacks can land on the same centroid
+(0 km apart) while being 200 km apart on the ground, so proximity decisions
+(is_nearby, NearbyLookup) use exact matches only and fall back to the old
+pincode-difference rule for everything else.
+"""
+import csv
+import math
+import os
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.2
+BUNDLED_CSV = os.path.join(os.path.dirname(__file__), 'data', 'pincode_centroids.csv')
+LEGACY_NEARBY_PIN_DIFF = 100 # the pre-geo heuristic, for pincodes the table can't place exactly
+
+
+def normalize_pincode(value):
+    """Returns the pincode as an int, or None if it isn't a valid 6-digit Indian pincode."""
+    if value is None:
+        return None
+    text = str(value).replace(' ', '').strip()
+    if len(text) != 6 or not text.isdigit() or text[0] == '0':
+        return None
+    return int(text)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between points given in degrees. Broadcasts over numpy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _group_mean(keys, lat, lon):
+    """Averages coordinates per key; returns (sorted unique keys, mean lat, mean lon)."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse)
+    return (
+        unique.astype(np.int32),
+        np.bincount(inverse, weights=lat) / counts,
+        np.bincount(inverse, weights=lon) / counts,
+    )
+
+
+class PincodeIndex:
+    def __init__(self, pincodes, lat, lon, grid_cell_deg=0.5):
+        # Multiple post offices share a pincode in the India Post data; keep one centroid each
+        self.pincodes, self.lat, self.lon = _group_mean(np.asarray(pincodes, dtype=np.int64), np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+        self.district_keys, self.district_lat, self.district_lon = _group_mean(self.pincodes // 1000, self.lat, self.lon)
+        self.region_keys, self.region_lat, self.region_lon = _group_mean(self.pincodes // 10000, self.lat, self.lon)
+        self._build_grid(grid_cell_deg)
+
+    @classmethod
+    def from_csv(cls, path):
+        pincodes, lat, lon = [], [], []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                pin = normalize_pincode(row.get('pincode'))
+                try:
+                    row_lat, row_lon = float(row['latitude']), float(row['longitude'])
+                except (KeyError, TypeError, ValueError): # 'NA' coordinates in the India Post dump
+                    continue
+                if pin is None or math.isnan(row_lat) or math.isnan(row_lon):
+                    continue
+                pincodes.append(pin)
+                lat.append(row_lat)
+                lon.append(row_lon)
+        return cls(pincodes, lat, lon)
+
+    def __len__(self):
+        return len(self.pincodes)
+
+    # --- Lookups ---
+
+    @staticmethod
+    def _lookup(keys, values, table_lat, table_lon, out_lat, out_lon, pending):
+        if not pending.any() or not len(keys):
+            return pending
+        pos = np.clip(np.searchsorted(keys, values), 0, len(keys) - 1)
+        hit = pending & (keys[pos] == values)
+        out_lat[hit] = table_lat[pos[hit]]
+        out_lon[hit] = table_lon[pos[hit]]
+        return pending & ~hit
+
+    def locate_many(self, pincodes, exact=False):
+        """
+        Coordinates (lat, lon arrays in degrees) for pincodes (strings or an int array); NaN where
+        unresolvable. With exact=True only pincodes present in the table resolve (no district/region
+        centroids).
+        """
+        if isinstance(pincodes, np.ndarray) and pincodes.dtype.kind in 'iu':
+            values = np.where((pincodes >= 100000) & (pincodes <= 999999), pincodes, -1).astype(np.int64)
+        else:
+            values = np.array([normalize_pincode(p) or -1 for p in pincodes], dtype=np.int64)
+        out_lat = np.full(len(values), np.nan)
+        out_lon = np.full(len(values), np.nan)
+        pending = values >= 0
+        pending = self._lookup(self.pincodes, values, self.lat, self.lon, out_lat, out_lon, pending)
+        if exact:
+            return out_lat, out_lon
+        pending = self._lookup(self.district_keys, values // 1000, self.district_lat, self.district_lon, out_lat, out_lon, pending)
+        self._lookup(self.region_keys, values // 10000, self.region_lat, self.region_lon, out_lat, out_lon, pending)
+        return out_lat, out_lon
+
+    def locate(self, pincode, exact=False):
+        """(lat, lon) in degrees for one pincode, or None."""
+        lat, lon = self.locate_many([pincode], exact)
+        if np.isnan(lat[0]):
+            return None
+        return float(lat[0]), float(lon[0])
+
+    # --- Distances ---
+
+    def distance_km(self, pin1, pin2, exact=False):
+        """Distance between two pincodes in km, or None if either can't be located."""
+        lat, lon = self.locate_many([pin1, pin2], exact)
+        if np.isnan(lat).any():
+            return None
+        return float(haversine_km(lat[0], lon[0], lat[1], lon[1]))
+
+    def distances_km(self, origin, pincodes):
+        """Distances from one pincode to many; NaN for unresolvable entries."""
+        lat, lon = self.locate_many([origin])
+        targets_lat, targets_lon = self.locate_many(pincodes)
+        return haversine_km(lat[0], lon[0], targets_lat, targets_lon)
+
+    def distance_matrix(self, pincodes_a, pincodes_b=None):
+        """len(a) x len(b) matrix of distances in km (b defaults to a); NaN rows/columns for unknown pins."""
+        lat_a, lon_a = self.locate_many(pincodes_a)
+        if pincodes_b is None:
+            lat_b, lon_b = lat_a, lon_a
+        else:
+            lat_b, lon_b = self.locate_many(pincodes_b)
+        return haversine_km(lat_a[:, None], lon_a[:, None], lat_b[None, :], lon_b[None, :])
+
+    def nearest(self, origin, candidates):
+        """The candidate pincode closest to `origin`, or None if nothing can be located."""
+        candidates = list(candidates)
+        if not candidates:
+            return None
+        distances = self.distances_km(origin, candidates)
+        if np.isnan(distances).all():
+            return None
+        return candidates[int(np.nanargmin(distances))]
+
+    # --- Radius queries (uniform lat/lon grid) ---
+
+    def _cell_keys(self, lat, lon):
+        rows = np.floor(np.asarray(lat) / self.grid_cell_deg).astype(np.int64)
+        cols = np.floor(np.asarray(lon) / self.grid_cell_deg).astype(np.int64)
+        return rows * 100000 + cols # India spans well under 100000 columns
+
+    def _build_grid(self, grid_cell_deg):
+        self.grid_cell_deg = grid_cell_deg
+        keys = self._cell_keys(self.lat, self.lon)
+        self._grid_order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self._grid_order]
+        cells, starts = np.unique(sorted_keys, return_index=True)
+        ends = np.append(starts[1:], len(sorted_keys))
+        self._grid = {int(cell): (int(start), int(end)) for cell, start, end in zip(cells, starts, ends)}
+
+    def within_radius(self, origin, radius_km, exact=False):
+        """[(pincode, distance_km)] for every indexed pincode within radius_km of origin, nearest first."""
+        center = self.locate(origin, exact)
+        if center is None:
+            return []
+        lat, lon = center
+        lat_span = math.ceil(radius_km / (KM_PER_DEGREE * self.grid_cell_deg))
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + lat_span * self.grid_cell_deg, 89.0))), 0.01)
+        lon_span = math.ceil(radius_km / (KM_PER_DEGREE * self.grid_cell_deg * cos_lat))
+        center_row = math.floor(lat / self.grid_cell_deg)
+        center_col = math.floor(lon / self.grid_cell_deg)
+
+        chunks = []
+        for row in range(center_row - lat_span, center_row + lat_span + 1):
+            for col in range(center_col - lon_span, center_col + lon_span + 1):
+                bounds = self._grid.get(row * 100000 + col)
+                if bounds:
+                    chunks.append(self._grid_order[bounds[0]:bounds[1]])
+        if not chunks:
+            return []
+        rows = np.concatenate(chunks)
+        distances = haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+        inside = distances <= radius_km
+        rows, distances = rows[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return [(f"{self.pincodes[r]:06d}", float(d)) for r, d in zip(rows[order], distances[order])]
+
+
+class NearbyLookup:
+    """
+    Radius queries among a list of pincodes (e.g. one product's listings) through the grid, so
+    memory stays linear in the list instead of an n x n distance matrix. Two exactly located pins
+    are compared by distance; any pair involving a pin the table can't place exactly uses the old
+    `abs(pin1 - pin2) < 100` rule, and malformed pins only match an identical string.
+    """
+
+    def __init__(self, index, pincodes, radius_km):
+        self.index = index
+        self.radius_km = radius_km
+        self.raw = [str(p).strip() if p is not None else '' for p in pincodes]
+        self.values = [normalize_pincode(p) for p in pincodes]
+        lat, _ = index.locate_many(self.raw, exact=True)
+        self.located = ~np.isnan(lat)
+        self.by_pin = defaultdict(list)
+        self.by_raw = defaultdict(list) # malformed pins
+        for i, value in enumerate(self.values):
+            if value is None:
+                self.by_raw[self.raw[i]].append(i)
+            else:
+                self.by_pin[value].append(i)
+        self.sorted_pins = np.array(sorted(self.by_pin), dtype=np.int64)
+
+    def neighbours(self, i):
+        """Sorted indices of the other entries near entry i."""
+        pin = self.values[i]
+        if pin is None:
+            return [j for j in self.by_raw[self.raw[i]] if j != i]
+        found = set()
+        start = np.searchsorted(self.sorted_pins, pin - LEGACY_NEARBY_PIN_DIFF + 1)
+        end = np.searchsorted(self.sorted_pins, pin + LEGACY_NEARBY_PIN_DIFF)
+        for other in self.sorted_pins[start:end]:
+            found.update(j for j in self.by_pin[int(other)] if not (self.located[i] and self.located[j]))
+        if self.located[i]:
+            for other, _ in self.index.within_radius(pin, self.radius_km, exact=True):
+                found.update(j for j in self.by_pin.get(int(other), ()) if self.located[j])
+        found.discard(i)
+        return sorted(found)
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    """The process-wide PincodeIndex, loaded on first use."""
+    return PincodeIndex.from_csv(getattr(settings, 'GEO_PINCODE_CSV', None) or BUNDLED_CSV)
+
+
+def nearby_radius_km():
+    return getattr(settings, 'GEO_NEARBY_RADIUS_KM', 50)
+
+
+def distance_km(pin1, pin2):
+    return get_index().distance_km(pin1, pin2)
+
+
+def is_nearby(pin1, pin2, radius_km=None):
+    """
+    True if both pincodes are in the table and lie within radius_km (default
+    settings.GEO_NEARBY_RADIUS_KM); pins without an exact match fall back to the old
+    pincode-difference rule rather than to a shared district/region centroid.
+    """
+    distance = get_index().distance_km(pin1, pin2, exact=True)
+    if distance is not None:
+        return distance <= (radius_km if radius_km is not None else nearby_radius_km())
+    value1, value2 = normalize_pincode(pin1), normalize_pincode(pin2)
+    if value1 is None or value2 is None:
+        return value1 is None and value2 is None and str(pin1).strip() == str(pin2).strip()
+    return abs(value1 - value2) < LEGACY_NEARBY_PIN_DIFF
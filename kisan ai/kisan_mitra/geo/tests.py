@@ -0,0 +1,26 @@
+from django.test import SimpleTestCase
+from .pincodes import NearbyLookup, get_index, is_nearby
+
+
+class ProximityTests(SimpleTestCase):
+    def test_exact_pins_compare_by_distance(self):
+        self.assertTrue(is_nearby('110001', '121001')) # New Delhi - Faridabad, ~25 km
+        self.assertFalse(is_nearby('110001', '400001'))
+
+    def test_bundled_table_places_every_district(self):
+        self.assertGreater(len(get_index()), 19000)
+        self.assertAlmostEqual(get_index().distance_km('413001', '416001'), 225, delta=25) # Solapur - Kolhapur
+        self.assertFalse(is_nearby('413001', '416001'))
+
+    def test_centroid_fallbacks_are_not_treated_as_nearby(self):
+        # Neither pincode is allotted, so both fall back to the same sorting-district centroid
+        self.assertEqual(get_index().distance_km('413050', '413950'), 0.0)
+        self.assertFalse(is_nearby('413050', '413950'))
+        self.assertTrue(is_nearby('413001', '413050')) # old pincode-difference rule
+
+    def test_nearby_lookup_matches_is_nearby(self):
+        pins = ['413001', '416001', '413050', '110001', '110002', '121001', '400001', 'bad', 'bad']
+        lookup = NearbyLookup(get_index(), pins, 50)
+        for i, pin in enumerate(pins):
+            expected = [j for j, other in enumerate(pins) if j != i and is_nearby(pin, other, 50)]
+            self.assertEqual(lookup.neighbours(i), expected, pin)
@@ -30,6 +30,8 @@ INSTALLED_APPS = [
     'users',       # Your custom user app
     'chatbot',     # Your chatbot app
     'marketplace', # Your marketplace app
+    'geo',         # Pincode proximity engine shared by marketplace and chatbot
+    'notifications', # Outbox + batched SMS/in-app/email delivery
     # 'whitenoise.runserver_nostatic', # For production static files on Render
     # 'sslserver', # For local HTTPS if needed
     'corsheaders', # If you use separate frontend, but here it's integrated
@@ -49,6 +51,48 @@ MEDIA_URL = '/media/'
 OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY')
 GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY') # For LangChain integration
+CHATBOT_PRELOAD = os.environ.get('CHATBOT_PRELOAD', 'False') == 'True' # Import LangChain at worker boot instead of on first chat
+CHATBOT_TOOL_TIMEOUTS = {'get_weather_forecast': 8, 'get_market_prices': 8, 'recommend_crop': 3, 'analyze_crop_image': 20} # seconds per tool call
+CHATBOT_ROUTER_MIN_CONFIDENCE = 0.8 # Below this the deterministic router defers to the Gemini agent
+CHAT_RETENTION_DAYS = 90 # Sessions idle this long have their messages compressed into ChatSessionArchive
+CHAT_ARCHIVE_BATCH_SIZE = 200 # sessions per archival transaction
+
+# --- Cache ---
+# Dashboards (marketplace/dashboards.py) are served from here, and the invalidation signals fire in
+# every gunicorn worker and in run_tasks, so the cache must be shared between processes (never LocMem).
+# Use Redis in production; without REDIS_URL fall back to the database (python manage.py createcachetable).
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'kisan_mitra_cache'}}
+DASHBOARD_CACHE_TIMEOUT = 60 * 60 # Safety net only; entries are invalidated by signals
+
+# --- Task runner (marketplace/task_runner.py, python manage.py run_tasks) ---
+TASK_RUNNER = {
+    'MODE': os.environ.get('TASK_RUNNER_MODE', 'worker'), # 'local' runs tasks inline, for tests/dev without a worker
+    'POOL': os.environ.get('TASK_RUNNER_POOL', 'thread'), # 'thread' or 'process'
+    'WORKERS': {'votes': 4, 'logistics': 2, 'notifications': 1, 'grouping': 1, 'maintenance': 1},
+    'BATCH_SIZE': 20,
+    'POLL_INTERVAL': 2,
+    'GROUPING_INTERVAL': 60 * 60, # group_similar_listings runs hourly
+    'CHAT_ARCHIVE_INTERVAL': 24 * 60 * 60, # archive_old_chat_sessions runs daily
+}
+
+# --- Notifications (notifications/dispatcher.py) ---
+NOTIFICATION_DEFAULT_CHANNELS = ['in_app', 'sms']
+NOTIFICATION_PROVIDERS = {
+    'sms': 'notifications.providers.FakeProvider', # Swap for a real SMS gateway provider
+    'in_app': 'notifications.providers.InAppProvider',
+    'email': 'notifications.providers.EmailProvider',
+}
+NOTIFICATION_RATE_LIMITS = {'sms': 10, 'email': 5} # messages per second, per dispatcher process
+NOTIFICATION_BATCH_SIZE = 500 # outbox rows claimed per dispatch pass
+NOTIFICATION_SENDING_TIMEOUT = 15 * 60 # seconds before a 'sending' row orphaned by a dead dispatcher is retried
+
+# --- Geo (geo/pincodes.py) ---
+GEO_PINCODE_CSV = os.environ.get('GEO_PINCODE_CSV') # Overrides the bundled India Post pincode centroids
+GEO_NEARBY_RADIUS_KM = 50 # Listings within this distance can be grouped together
 
 # --- CORS Headers (if needed) ---
 CORS_ALLOW_ALL_ORIGINS = True # Be more restrictive in production
\ No newline at end of file
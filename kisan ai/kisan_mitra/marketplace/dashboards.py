@@ -0,0 +1,128 @@
+"""
+Per-user dashboard summaries, served from the cache.
+
+Building a dashboard joins listings, groups, offers and votes (a dozen or so
+queries); serving it is a single cache.get(). Entries never go stale on their
+own: marketplace/signals.py works out exactly which users a changed
+ProductListing, FarmerGroup, Offer or OfferVote appears for and bumps those
+users' dashboard generation once the transaction commits. The timeout is only
+a safety net.
+
+Entries carry the generation they were built for rather than being deleted: a
+request that missed the cache and built its summary from pre-commit data
+stores it tagged with the generation it read before building, which the bump
+has already retired, so it can never serve a stale dashboard back. Generation
+and entry are fetched together with one get_many(), so a hit is a single cache
+round trip.
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from .models import ProductListing, FarmerGroup, Offer, OfferVote
+
+
+def dashboard_version_key(kind, user_id):
+    return f"dashboard-version:{kind}:{user_id}"
+
+
+def dashboard_cache_key(kind, user_id):
+    return f"dashboard:{kind}:{user_id}"
+
+
+def _new_version():
+    # Time-based so a version key that was evicted never restarts at a value with live entries
+    return time.time_ns()
+
+
+def _ensure_version(key):
+    # Only on the first read for a user (or after eviction); add() keeps a concurrent bump
+    cache.add(key, _new_version(), None)
+    return cache.get(key)
+
+
+def dashboard_timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60 * 60)
+
+
+def build_farmer_summary(user_id):
+    listings = list(
+        ProductListing.objects.filter(farmer_id=user_id)
+        .order_by('-listing_date')
+        .values('id', 'product_name', 'quantity_kg', 'price_expectation_per_kg', 'location_pin_code', 'is_active', 'listing_date')
+    )
+    groups = list(
+        FarmerGroup.objects.filter(Q(products__farmer_id=user_id) | Q(leader_id=user_id))
+        .distinct()
+        .order_by('-created_at')
+        .values('id', 'group_name', 'status', 'total_quantity_kg', 'leader_id', 'created_at')
+    )
+    group_ids = [group['id'] for group in groups]
+    offers = list(
+        Offer.objects.filter(group_id__in=group_ids)
+        .order_by('-offer_date')
+        .values('id', 'group_id', 'group__group_name', 'buyer__username', 'offered_price_per_kg', 'offered_quantity_kg', 'status', 'offer_date')
+    )
+    my_votes = dict(OfferVote.objects.filter(farmer_id=user_id, offer_id__in=[o['id'] for o in offers]).values_list('offer_id', 'vote'))
+    for offer in offers:
+        offer['my_vote'] = my_votes.get(offer['id'])
+    return {
+        'listings': listings,
+        'groups': groups,
+        'pending_offers': [o for o in offers if o['status'] == 'pending' and o['my_vote'] is None],
+        'offers': offers,
+    }
+
+
+def build_buyer_summary(user_id):
+    offers = list(
+        Offer.objects.filter(buyer_id=user_id)
+        .annotate(
+            accept_votes=Count('votes', filter=Q(votes__vote='accept')),
+            reject_votes=Count('votes', filter=Q(votes__vote='reject')),
+            counter_votes=Count('votes', filter=Q(votes__vote='counter')),
+        )
+        .order_by('-offer_date')
+        .values(
+            'id', 'group_id', 'group__group_name', 'group__status', 'group__total_quantity_kg',
+            'offered_price_per_kg', 'offered_quantity_kg', 'status', 'offer_date',
+            'accept_votes', 'reject_votes', 'counter_votes',
+        )
+    )
+    return {
+        'offers': offers,
+        'pending_offers': [o for o in offers if o['status'] == 'pending'],
+    }
+
+
+BUILDERS = {
+    'farmer': build_farmer_summary,
+    'buyer': build_buyer_summary,
+}
+
+
+def get_dashboard(kind, user_id):
+    """Cached summary for one user; built and stored on a miss."""
+    version_key, key = dashboard_version_key(kind, user_id), dashboard_cache_key(kind, user_id)
+    found = cache.get_many([version_key, key]) # one round trip on Redis and the database cache
+    version = found.get(version_key)
+    if version is None:
+        version = _ensure_version(version_key)
+    entry = found.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    # The generation was read before building: an invalidation that lands mid-build retires this entry
+    summary = BUILDERS[kind](user_id)
+    cache.set(key, (version, summary), dashboard_timeout())
+    return summary
+
+
+def invalidate_dashboards(farmer_ids=(), buyer_ids=()):
+    keys = [dashboard_version_key('farmer', user_id) for user_id in set(farmer_ids) if user_id] + \
+           [dashboard_version_key('buyer', user_id) for user_id in set(buyer_ids) if user_id]
+    for key in keys:
+        try:
+            cache.incr(key) # atomic on Redis; get+set on the database cache, but racing bumps still retire the old value
+        except ValueError:
+            # No generation yet (or evicted): nothing can be cached under a fresh one
+            cache.set(key, _new_version(), None)
@@ -0,0 +1,35 @@
+import signal
+from django.core.management.base import BaseCommand
+from marketplace.task_runner import TaskRunner, get_config
+from marketplace.tasks import group_similar_listings
+from notifications.tasks import dispatch_notifications
+from chatbot.tasks import archive_old_chat_sessions
+
+
+class Command(BaseCommand):
+    help = "Runs the marketplace task worker (votes > logistics > notifications > grouping > maintenance)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Claim and run a single batch per queue, then exit.")
+
+    def handle(self, *args, **options):
+        config = get_config()
+        runner = TaskRunner(periodic=[
+            (group_similar_listings, config['GROUPING_INTERVAL']),
+            (dispatch_notifications, config['NOTIFICATION_RETRY_INTERVAL']),
+            (archive_old_chat_sessions, config['CHAT_ARCHIVE_INTERVAL']),
+        ], config=config)
+
+        if options['once']:
+            runner.start()
+            try:
+                claimed = runner.run_once()
+            finally:
+                runner.shutdown()
+            self.stdout.write(f"Ran {claimed} tasks.")
+            return
+
+        # Let Render/Heroku stop the dyno cleanly: finish in-flight tasks, claim nothing new
+        signal.signal(signal.SIGTERM, lambda *_: runner.stop())
+        signal.signal(signal.SIGINT, lambda *_: runner.stop())
+        runner.run_forever()
@@ -68,4 +68,31 @@ class SupplyChainLogistics(models.Model):
     # Could link to delivery agents, vehicles etc.
 
     def __str__(self):
-        return f"Logistics for Group {self.farmer_group.group_name}"
\ No newline at end of file
+        return f"Logistics for Group {self.farmer_group.group_name}"
+class QueuedTask(models.Model):
+    # Persistent queue row for marketplace.task_runner (replaces django-background-tasks' table)
+    STATUS_CHOICES = [('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed')]
+
+    task_name = models.CharField(max_length=255)
+    queue = models.CharField(max_length=20) # 'votes', 'logistics' or 'grouping'
+    args = models.JSONField(default=list, blank=True)
+    dedup_key = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_at = models.DateTimeField()
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Covers the claim query: WHERE queue=? AND status='pending' AND run_at<=? ORDER BY run_at
+            models.Index(fields=['queue', 'status', 'run_at']),
+        ]
+        constraints = [
+            # Only one pending copy of e.g. process_offer_votes(offer_id=42) may sit in the queue
+            models.UniqueConstraint(fields=['dedup_key'], condition=models.Q(status='pending'), name='unique_pending_task'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name}{tuple(self.args)} [{self.queue}/{self.status}]"
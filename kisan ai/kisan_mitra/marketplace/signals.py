@@ -0,0 +1,76 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .dashboards import invalidate_dashboards
+from .models import ProductListing, FarmerGroup, Offer, OfferVote
+
+# Each handler works out whose dashboards show the changed row and drops exactly those
+# cache entries after commit, so a concurrent request can't re-cache pre-commit data.
+
+
+def _invalidate_on_commit(farmer_ids=(), buyer_ids=()):
+    farmer_ids, buyer_ids = set(farmer_ids), set(buyer_ids)
+    transaction.on_commit(lambda: invalidate_dashboards(farmer_ids, buyer_ids))
+
+
+def _group_farmer_ids(group_ids):
+    """Member farmers and leaders of the given groups."""
+    farmer_ids = set(ProductListing.objects.filter(farmer_groups__in=group_ids).values_list('farmer_id', flat=True))
+    farmer_ids.update(FarmerGroup.objects.filter(id__in=group_ids).values_list('leader_id', flat=True))
+    return farmer_ids
+
+
+def _group_buyer_ids(group_ids):
+    return set(Offer.objects.filter(group_id__in=group_ids).values_list('buyer_id', flat=True))
+
+
+@receiver(post_save, sender=ProductListing)
+@receiver(post_delete, sender=ProductListing)
+def listing_changed(sender, instance, **kwargs):
+    # Group membership changes arrive through m2m_changed below
+    _invalidate_on_commit(farmer_ids=[instance.farmer_id])
+
+
+@receiver(post_save, sender=FarmerGroup)
+def group_saved(sender, instance, created, **kwargs):
+    if created:
+        # No members or offers yet; products.set() reports membership separately
+        _invalidate_on_commit(farmer_ids=[instance.leader_id])
+        return
+    _invalidate_on_commit(farmer_ids=_group_farmer_ids([instance.id]), buyer_ids=_group_buyer_ids([instance.id]))
+
+
+@receiver(pre_delete, sender=FarmerGroup)
+def group_deleted(sender, instance, **kwargs):
+    # pre_delete: memberships and offers are gone by post_delete
+    _invalidate_on_commit(farmer_ids=_group_farmer_ids([instance.id]), buyer_ids=_group_buyer_ids([instance.id]))
+
+
+@receiver(m2m_changed, sender=FarmerGroup.products.through)
+def group_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # listing.farmer_groups.add(...): instance is a listing, pk_set are groups
+        group_ids = pk_set if pk_set is not None else set(instance.farmer_groups.values_list('id', flat=True))
+        farmer_ids = {instance.farmer_id}
+    else:
+        group_ids = {instance.id}
+        listing_ids = pk_set if pk_set is not None else set(instance.products.values_list('id', flat=True))
+        farmer_ids = set(ProductListing.objects.filter(id__in=listing_ids).values_list('farmer_id', flat=True))
+    farmer_ids |= _group_farmer_ids(group_ids)
+    _invalidate_on_commit(farmer_ids=farmer_ids, buyer_ids=_group_buyer_ids(group_ids))
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def offer_changed(sender, instance, **kwargs):
+    _invalidate_on_commit(farmer_ids=_group_farmer_ids([instance.group_id]), buyer_ids=[instance.buyer_id])
+
+
+@receiver(post_save, sender=OfferVote)
+@receiver(post_delete, sender=OfferVote)
+def vote_changed(sender, instance, **kwargs):
+    # The voter's pending list changes, and the buyer sees vote tallies
+    buyer_ids = Offer.objects.filter(id=instance.offer_id).values_list('buyer_id', flat=True)
+    _invalidate_on_commit(farmer_ids=[instance.farmer_id], buyer_ids=buyer_ids)
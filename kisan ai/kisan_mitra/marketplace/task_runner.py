@@ -0,0 +1,401 @@
+"""
+Batched, prioritized task runner for marketplace jobs.
+
+Replaces django-background-tasks, which polled its table once per task and ran
+one task at a time. Here every job is a row in ``QueuedTask``; a worker
+(``python manage.py run_tasks``) claims pending rows in batches, one queue at a
+time in priority order (votes > logistics > notifications > grouping >
+maintenance), and hands them to a per-queue thread or process pool so a long
+grouping run can never starve vote processing.
+
+Usage::
+
+    @task(queue='votes', dedup=True)
+    def process_offer_votes(offer_id): ...
+
+    process_offer_votes.delay(offer.id)  # enqueue (runs inline in 'local' mode)
+    process_offer_votes.now(offer.id)    # run synchronously in this process
+"""
+import importlib
+import logging
+import django
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Lower number = claimed first
+QUEUE_PRIORITIES = {
+    'votes': 0,
+    'logistics': 10,
+    'notifications': 15,
+    'grouping': 20,
+    'maintenance': 30,
+}
+
+DEFAULTS = {
+    'MODE': 'worker',       # 'local' runs tasks inline on .delay() (tests, dev without a worker)
+    'POOL': 'thread',       # 'thread' or 'process'
+    'WORKERS': {'votes': 4, 'logistics': 2, 'notifications': 1, 'grouping': 1, 'maintenance': 1},
+    'BATCH_SIZE': 20,       # max rows claimed per queue per poll
+    'POLL_INTERVAL': 2,     # seconds to sleep when every queue came back empty
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 30,      # seconds, multiplied by the attempt number
+    'STALE_AFTER': 15 * 60, # 'running' rows older than this are assumed orphaned by a dead worker
+    'METRICS_INTERVAL': 60, # seconds between metrics log lines
+    'GROUPING_INTERVAL': 60 * 60,
+    'NOTIFICATION_RETRY_INTERVAL': 60, # re-run the dispatcher for outbox rows waiting on a retry
+    'CHAT_ARCHIVE_INTERVAL': 24 * 60 * 60,
+}
+
+_registry = {}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'TASK_RUNNER', {}))
+    return config
+
+
+def is_local_mode():
+    return get_config()['MODE'] == 'local'
+
+
+class TaskMetrics:
+    """Thread-safe counters for queue lag and throughput, per queue."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.monotonic()
+            self._stats = {}
+
+    def _queue(self, queue):
+        return self._stats.setdefault(queue, {
+            'enqueued': 0, 'deduplicated': 0, 'claimed': 0, 'claim_batches': 0,
+            'completed': 0, 'failed': 0,
+            'lag_total': 0.0, 'lag_max': 0.0, 'run_total': 0.0,
+        })
+
+    def record_enqueue(self, queue, deduplicated=False):
+        with self._lock:
+            stats = self._queue(queue)
+            stats['deduplicated' if deduplicated else 'enqueued'] += 1
+
+    def record_claim(self, queue, lags):
+        with self._lock:
+            stats = self._queue(queue)
+            stats['claim_batches'] += 1
+            stats['claimed'] += len(lags)
+            stats['lag_total'] += sum(lags)
+            stats['lag_max'] = max([stats['lag_max']] + lags)
+
+    def record_run(self, queue, duration, ok):
+        with self._lock:
+            stats = self._queue(queue)
+            stats['completed' if ok else 'failed'] += 1
+            stats['run_total'] += duration
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            result = {}
+            for queue, stats in self._stats.items():
+                finished = stats['completed'] + stats['failed']
+                result[queue] = {
+                    'enqueued': stats['enqueued'],
+                    'deduplicated': stats['deduplicated'],
+                    'claimed': stats['claimed'],
+                    'completed': stats['completed'],
+                    'failed': stats['failed'],
+                    'avg_claim_batch': stats['claimed'] / stats['claim_batches'] if stats['claim_batches'] else 0.0,
+                    'avg_lag_s': stats['lag_total'] / stats['claimed'] if stats['claimed'] else 0.0,
+                    'max_lag_s': stats['lag_max'],
+                    'avg_run_s': stats['run_total'] / finished if finished else 0.0,
+                    'throughput_per_s': stats['completed'] / elapsed,
+                }
+            return result
+
+
+metrics = TaskMetrics()
+
+
+def queue_depths():
+    """Pending rows per queue and the age of the oldest one (the current queue lag)."""
+    from .models import QueuedTask
+
+    now = timezone.now()
+    depths = {}
+    for queue in QUEUE_PRIORITIES:
+        pending = QueuedTask.objects.filter(queue=queue, status='pending', run_at__lte=now)
+        oldest = pending.order_by('run_at').values_list('run_at', flat=True).first()
+        depths[queue] = {
+            'pending': pending.count(),
+            'lag_s': (now - oldest).total_seconds() if oldest else 0.0,
+        }
+    return depths
+
+
+class Task:
+    def __init__(self, func, queue, dedup):
+        if queue not in QUEUE_PRIORITIES:
+            raise ValueError(f"Unknown task queue '{queue}'. Expected one of {list(QUEUE_PRIORITIES)}.")
+        self.func = func
+        self.queue = queue
+        self.dedup = dedup
+        self.name = f"{func.__module__}.{func.__name__}"
+        self.__doc__ = func.__doc__
+        self.__name__ = func.__name__
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def now(self, *args):
+        """Runs the task synchronously in the calling process."""
+        return self.func(*args)
+
+    def dedup_key(self, args):
+        if not self.dedup:
+            return None
+        return f"{self.name}:{':'.join(str(arg) for arg in args)}"
+
+    def delay(self, *args, schedule=0):
+        """
+        Enqueues the task to run `schedule` seconds from now. Returns the QueuedTask row,
+        or None when the task ran inline (local mode). If an identical task is already
+        pending, that row is returned instead of queueing a duplicate.
+        """
+        if is_local_mode():
+            metrics.record_enqueue(self.queue)
+            _execute(self, list(args))
+            return None
+
+        from .models import QueuedTask
+
+        dedup_key = self.dedup_key(args)
+        if dedup_key:
+            existing = QueuedTask.objects.filter(dedup_key=dedup_key, status='pending').first()
+            if existing:
+                metrics.record_enqueue(self.queue, deduplicated=True)
+                return existing
+        try:
+            # Savepoint so a lost dedup race doesn't break the caller's transaction
+            with transaction.atomic():
+                queued = QueuedTask.objects.create(
+                    task_name=self.name,
+                    queue=self.queue,
+                    args=list(args),
+                    dedup_key=dedup_key,
+                    run_at=timezone.now() + timedelta(seconds=schedule),
+                )
+        except IntegrityError:
+            metrics.record_enqueue(self.queue, deduplicated=True)
+            return QueuedTask.objects.filter(dedup_key=dedup_key, status='pending').first()
+        metrics.record_enqueue(self.queue)
+        return queued
+
+
+def task(queue, dedup=False):
+    """Registers a function as a runner task. `dedup=True` collapses pending duplicates with equal args."""
+    def decorator(func):
+        wrapped = Task(func, queue, dedup)
+        _registry[wrapped.name] = wrapped
+        return wrapped
+    return decorator
+
+
+def _execute(task_obj, args):
+    started = time.monotonic()
+    try:
+        task_obj.func(*args)
+    except Exception:
+        metrics.record_run(task_obj.queue, time.monotonic() - started, ok=False)
+        raise
+    metrics.record_run(task_obj.queue, time.monotonic() - started, ok=True)
+
+
+def _run_claimed(task_name, args):
+    """Pool entry point. Module-level so it can be pickled for the process pool."""
+    if task_name not in _registry:
+        # Spawned/forkserver workers start with an empty registry (Django itself is set up by _init_process_worker)
+        importlib.import_module(task_name.rsplit('.', 1)[0])
+    close_old_connections()
+    try:
+        _registry[task_name].func(*args)
+    finally:
+        close_old_connections()
+
+
+def _init_process_worker():
+    from django.apps import apps
+
+    if not apps.ready:
+        # Spawned/forkserver children start from a fresh interpreter; DJANGO_SETTINGS_MODULE is inherited
+        django.setup()
+    # Forked children must not reuse the parent's DB sockets
+    connections.close_all()
+
+
+class TaskRunner:
+    """Claims QueuedTask rows in batches and executes them on per-queue pools."""
+
+    def __init__(self, periodic=None, config=None):
+        self.config = config or get_config()
+        # [(Task, interval_seconds)], e.g. hourly group_similar_listings
+        self.periodic = [(t, interval, None) for t, interval in (periodic or [])]
+        self.pools = {}
+        self.in_flight = {queue: set() for queue in QUEUE_PRIORITIES}
+        self._stop = threading.Event()
+        self._last_metrics_log = time.monotonic()
+
+    def _make_pool(self, workers):
+        if self.config['POOL'] == 'process':
+            connections.close_all()
+            return ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker)
+        return ThreadPoolExecutor(max_workers=workers)
+
+    def start(self):
+        for queue in sorted(QUEUE_PRIORITIES, key=QUEUE_PRIORITIES.get):
+            self.pools[queue] = self._make_pool(self.config['WORKERS'].get(queue, 1))
+        self.requeue_stale()
+
+    def stop(self):
+        self._stop.set()
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+        self.pools = {}
+
+    def requeue_stale(self):
+        from .models import QueuedTask
+
+        cutoff = timezone.now() - timedelta(seconds=self.config['STALE_AFTER'])
+        stale = QueuedTask.objects.filter(status='running', claimed_at__lt=cutoff)
+        with transaction.atomic():
+            # A fresh pending copy (e.g. a new vote queued while the worker was down) supersedes the
+            # orphaned row; requeueing both would violate unique_pending_task
+            pending_keys = QueuedTask.objects.filter(status='pending', dedup_key__isnull=False).values('dedup_key')
+            superseded, _ = stale.filter(dedup_key__in=pending_keys).delete()
+            # Two orphaned copies of the same task: keep the oldest
+            seen, duplicates = set(), []
+            for task_id, dedup_key in stale.filter(dedup_key__isnull=False).order_by('id').values_list('id', 'dedup_key'):
+                if dedup_key in seen:
+                    duplicates.append(task_id)
+                seen.add(dedup_key)
+            if duplicates:
+                superseded += QueuedTask.objects.filter(id__in=duplicates).delete()[0]
+            requeued = stale.update(status='pending', claimed_at=None)
+        if superseded:
+            logger.warning(f"Dropped {superseded} stale running tasks superseded by a pending copy")
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale running tasks")
+
+    def claim(self, queue, limit):
+        """Atomically flips up to `limit` due rows of one queue to 'running' in a single round trip pair."""
+        from .models import QueuedTask
+
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                QueuedTask.objects.select_for_update(skip_locked=True)
+                .filter(queue=queue, status='pending', run_at__lte=now)
+                .order_by('run_at')
+                .values('id', 'task_name', 'args', 'run_at', 'attempts')[:limit]
+            )
+            if rows:
+                QueuedTask.objects.filter(id__in=[row['id'] for row in rows]).update(status='running', claimed_at=now)
+        if rows:
+            metrics.record_claim(queue, [(now - row['run_at']).total_seconds() for row in rows])
+        return rows
+
+    def _free_slots(self, queue):
+        # Claim a bit ahead of the pool so small tasks don't wait for the next poll
+        capacity = self.config['WORKERS'].get(queue, 1) * 2
+        return min(self.config['BATCH_SIZE'], capacity - len(self.in_flight[queue]))
+
+    def _submit(self, queue, row):
+        task_obj = _registry.get(row['task_name'])
+        if task_obj is None:
+            self._finish(queue, row, 0.0, f"Unknown task {row['task_name']}")
+            return
+        started = time.monotonic()
+        future = self.pools[queue].submit(_run_claimed, row['task_name'], row['args'])
+        self.in_flight[queue].add(row['id'])
+        future.add_done_callback(
+            lambda f: self._finish(queue, row, time.monotonic() - started, f.exception())
+        )
+
+    def _finish(self, queue, row, duration, error):
+        from .models import QueuedTask
+
+        self.in_flight[queue].discard(row['id'])
+        metrics.record_run(queue, duration, ok=error is None)
+        try:
+            if error is None:
+                QueuedTask.objects.filter(id=row['id']).delete()
+                return
+            attempts = row['attempts'] + 1
+            logger.error(f"Task {row['task_name']}{tuple(row['args'])} failed (attempt {attempts}): {error}")
+            if attempts >= self.config['MAX_ATTEMPTS']:
+                QueuedTask.objects.filter(id=row['id']).update(status='failed', attempts=attempts, last_error=str(error))
+            else:
+                retry_at = timezone.now() + timedelta(seconds=self.config['RETRY_DELAY'] * attempts)
+                QueuedTask.objects.filter(id=row['id']).update(
+                    status='pending', attempts=attempts, last_error=str(error), run_at=retry_at, claimed_at=None
+                )
+        except IntegrityError:
+            # A fresh pending duplicate was queued meanwhile; it supersedes this retry
+            QueuedTask.objects.filter(id=row['id']).delete()
+        finally:
+            close_old_connections()
+
+    def _enqueue_periodic(self):
+        now = time.monotonic()
+        for index, (task_obj, interval, last_run) in enumerate(self.periodic):
+            if last_run is None or now - last_run >= interval:
+                task_obj.delay()
+                self.periodic[index] = (task_obj, interval, now)
+
+    def run_once(self):
+        """One poll: claim and dispatch per queue in priority order. Returns the number of rows claimed."""
+        self._enqueue_periodic()
+        claimed = 0
+        for queue in sorted(QUEUE_PRIORITIES, key=QUEUE_PRIORITIES.get):
+            slots = self._free_slots(queue)
+            if slots <= 0:
+                continue
+            for row in self.claim(queue, slots):
+                self._submit(queue, row)
+                claimed += 1
+        return claimed
+
+    def _log_metrics(self):
+        if time.monotonic() - self._last_metrics_log < self.config['METRICS_INTERVAL']:
+            return
+        self._last_metrics_log = time.monotonic()
+        logger.info(f"Task runner depths: {queue_depths()}")
+        logger.info(f"Task runner metrics: {metrics.snapshot()}")
+
+    def run_forever(self):
+        self.start()
+        logger.info(f"Task runner started ({self.config['POOL']} pool, workers {self.config['WORKERS']})")
+        try:
+            while not self._stop.is_set():
+                claimed = self.run_once()
+                self._log_metrics()
+                close_old_connections()
+                if not claimed:
+                    self._stop.wait(self.config['POLL_INTERVAL'])
+        finally:
+            self.shutdown()
+            logger.info("Task runner stopped")
@@ -1,12 +1,18 @@
 import logging
+from collections import defaultdict
+from decimal import Decimal
+import numpy as np
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Sum
-from .models import ProductListing, FarmerGroup, Offer
+from .models import ProductListing, FarmerGroup, Offer, SupplyChainLogistics
 from users.models import User
+from geo.pincodes import NearbyLookup, get_index, haversine_km, nearby_radius_km
+from notifications.services import notify
 # from langchain_google_genai import GoogleGenerativeAIEmbeddings # For embeddings if needed
 
-# If using django-background-tasks
-from background_task import background
+# Batched, prioritized runner (python manage.py run_tasks); see task_runner.py
+from .task_runner import task
 # If using Celery, import app from your celery.py
 # from kisan_mitra.celery import app as celery_app
 
@@ -21,7 +27,7 @@ def get_embedding(text):
 # --- AI Unity Leader Tasks ---
 
 # @celery_app.task # If using Celery
-@background(schedule=60*60) # Run every hour (or tune frequency)
+@task(queue='grouping', dedup=True) # Scheduled hourly by run_tasks (TASK_RUNNER['GROUPING_INTERVAL'])
 def group_similar_listings():
     logger.info("Starting task: group_similar_listings")
     active_listings = ProductListing.objects.filter(is_active=True, farmer_groups__isnull=True) # Un-grouped active listings
@@ -39,54 +45,67 @@ def group_similar_listings():
     active_listings_with_embeddings = ProductListing.objects.filter(is_active=True, farmer_groups__isnull=True).exclude(embedding__isnull=True)
 
     # 2. Iterate and group based on similarity (simplified for concept)
-    grouped_listing_ids = set()
-    for listing1 in active_listings_with_embeddings:
-        if listing1.id in grouped_listing_ids:
-            continue
-
-        potential_group = [listing1]
-        grouped_listing_ids.add(listing1.id)
-
-        # Simple similarity: same product name and nearby pin codes
-        # In actual implementation: use vector similarity search (pgvector)
-        for listing2 in active_listings_with_embeddings:
-            if listing1.id == listing2.id or listing2.id in grouped_listing_ids:
+    # Bucket by product first so we only compare listings that could ever share a group,
+    # then find each seed's neighbours through the pincode grid (no n x n matrix).
+    listings_by_product = defaultdict(list)
+    for listing in active_listings_with_embeddings:
+        listings_by_product[listing.product_name].append(listing)
+
+    radius_km = nearby_radius_km()
+    pincode_index = get_index()
+    potential_groups = []
+    for product_listings in listings_by_product.values():
+        lookup = NearbyLookup(pincode_index, [x.location_pin_code for x in product_listings], radius_km)
+        grouped = set()
+        for i, listing1 in enumerate(product_listings):
+            if i in grouped:
                 continue
-            
-            # Simple criteria for grouping: same product name and within a few km (logic for 'nearby' needed)
-            if listing1.product_name == listing2.product_name and \
-               abs(int(listing1.location_pin_code) - int(listing2.location_pin_code)) < 100 : # Very simplistic 'nearby'
-                
+
+            potential_group = [listing1]
+            grouped.add(i)
+
+            # Simple similarity: same product name and within GEO_NEARBY_RADIUS_KM of listing1
+            # In actual implementation: use vector similarity search (pgvector)
+            for j in lookup.neighbours(i):
+                if j in grouped:
+                    continue
                 # More advanced: calculate cosine similarity between embeddings
                 # similarity = calculate_cosine_similarity(listing1.embedding, listing2.embedding)
                 # if similarity > THRESHOLD:
-                potential_group.append(listing2)
-                grouped_listing_ids.add(listing2.id)
+                potential_group.append(product_listings[j])
+                grouped.add(j)
+            potential_groups.append(potential_group)
 
+    for potential_group in potential_groups:
+        listing1 = potential_group[0]
         if len(potential_group) > 1: # Create a group if more than one listing
             total_quantity = sum(x.quantity_kg for x in potential_group)
             
             # Elect a leader: e.g., the farmer with the largest quantity in the group
-            leader = max(potential_group, key=lambda x: x.quantity_kg).farmer
+            leader_id = max(potential_group, key=lambda x: x.quantity_kg).farmer_id
 
             group_name = f"Group for {listing1.product_name} - {total_quantity}kg"
-            new_group = FarmerGroup.objects.create(
-                leader=leader,
-                group_name=group_name,
-                total_quantity_kg=total_quantity,
-                status='active'
-            )
-            new_group.products.set(potential_group)
-            
-            # Notify farmers in the group (e.g., via email or in-app notification)
-            for listing in potential_group:
-                logger.info(f"Notifying {listing.farmer.username} about new group: {new_group.group_name}")
-                # You'd send actual notifications here.
+            with transaction.atomic():
+                new_group = FarmerGroup.objects.create(
+                    leader_id=leader_id,
+                    group_name=group_name,
+                    total_quantity_kg=total_quantity,
+                    status='active'
+                )
+                new_group.products.set(potential_group)
+
+                # Notify farmers in the group: one bulk outbox insert, delivered in batches after commit
+                notify(
+                    [x.farmer_id for x in potential_group], 'group_created',
+                    f"Your {listing1.product_name} listing has joined {new_group.group_name}. Buyers can now make offers on the combined produce.",
+                    subject="You've joined a farmer group",
+                )
+            logger.info(f"Queued notifications for {len(potential_group)} listings in new group: {new_group.group_name}")
 
     logger.info("Finished task: group_similar_listings")
 
 # @celery_app.task # If using Celery
-@background(schedule=0) # Run immediately or on condition
+@task(queue='votes', dedup=True) # A burst of votes on one offer collapses into a single pending run
 def process_offer_votes(offer_id):
     logger.info(f"Processing votes for offer {offer_id}")
     offer = Offer.objects.get(id=offer_id)
@@ -101,56 +120,80 @@ def process_offer_votes(offer_id):
     counter_votes = offer.votes.filter(vote='counter').count()
 
     # Define majority threshold (e.g., 60% of group farmers must accept)
-    if total_voters > 0 and accept_votes / total_voters >= 0.6: # configurable threshold
-        offer.status = 'accepted'
-        group.status = 'deal_closed'
-        offer.save()
-        group.save()
-        logger.info(f"Offer {offer_id} accepted for group {group.id}.")
-        # Trigger supply chain optimization
-        trigger_supply_chain_optimization.now(offer.id)
-    elif reject_votes > 0: # If at least one farmer explicitly rejects
-        offer.status = 'rejected'
-        offer.save()
-        logger.info(f"Offer {offer_id} rejected for group {group.id}.")
-    elif counter_votes > 0:
-        offer.status = 'countered'
-        offer.save()
-        logger.info(f"Offer {offer_id} countered for group {group.id}. Leader should review.")
-    else:
-        logger.info(f"Offer {offer_id} still pending votes for group {group.id}.")
-    
-    # Notifications to buyer/farmers about offer status change would go here.
+    previous_status = offer.status
+    with transaction.atomic():
+        if total_voters > 0 and accept_votes / total_voters >= 0.6: # configurable threshold
+            offer.status = 'accepted'
+            group.status = 'deal_closed'
+            offer.save()
+            group.save()
+            logger.info(f"Offer {offer_id} accepted for group {group.id}.")
+            # Trigger supply chain optimization
+            trigger_supply_chain_optimization.delay(offer.id)
+        elif reject_votes > 0: # If at least one farmer explicitly rejects
+            offer.status = 'rejected'
+            offer.save()
+            logger.info(f"Offer {offer_id} rejected for group {group.id}.")
+        elif counter_votes > 0:
+            offer.status = 'countered'
+            offer.save()
+            logger.info(f"Offer {offer_id} countered for group {group.id}. Leader should review.")
+        else:
+            logger.info(f"Offer {offer_id} still pending votes for group {group.id}.")
+
+        # Notify buyer and farmers about the status change, committed together with it
+        if offer.status != previous_status:
+            notify(
+                [offer.buyer_id] + list(group_farmers.values_list('id', flat=True)), f"offer_{offer.status}",
+                f"The offer of ₹{offer.offered_price_per_kg}/kg on {group.group_name} has been {offer.status}.",
+                subject=f"Offer {offer.status}",
+            )
 
 # @celery_app.task
-@background(schedule=0)
+@task(queue='logistics', dedup=True)
 def trigger_supply_chain_optimization(offer_id):
     logger.info(f"Starting supply chain optimization for offer {offer_id}")
     offer = Offer.objects.get(id=offer_id)
     group = offer.group
 
     # Collect locations of all farmers in the group
-    farmer_locations = []
-    for listing in group.products.all():
-        if listing.farmer.pin_code:
-            farmer_locations.append(listing.farmer.pin_code) # or lat/lon if available
+    farmers = list(group.products.values_list('farmer_id', 'farmer__pin_code'))
+    farmer_locations = [pin_code for _, pin_code in farmers if pin_code] # or lat/lon if available
 
     buyer_location = offer.buyer.pin_code if offer.buyer.pin_code else None
 
+    # Meeting point: geographic centroid of the farmers' pincodes (fine at district scale)
+    farmer_lat, farmer_lon = get_index().locate_many(farmer_locations)
+    located = ~np.isnan(farmer_lat)
+    meeting_lat = meeting_lon = None
+    if located.any():
+        meeting_lat, meeting_lon = float(farmer_lat[located].mean()), float(farmer_lon[located].mean())
+        buyer_point = get_index().locate(buyer_location) if buyer_location else None
+        if buyer_point:
+            buyer_lat, buyer_lon = buyer_point
+            logger.info(f"Buyer for offer {offer_id} is {float(haversine_km(meeting_lat, meeting_lon, buyer_lat, buyer_lon)):.1f} km from the meeting point")
+
     # Call a function to hit Google Maps API
-    # This involves complex logic to find optimal meeting points/routes
+    # This involves complex logic to find optimal routes
     # For conceptual:
-    meeting_point = "Example Central Location"
+    meeting_point = f"{meeting_lat:.4f}, {meeting_lon:.4f}" if meeting_lat is not None else "Example Central Location"
     optimal_route_data = {"route_coords": "dummy_geojson"}
     estimated_cost = 500.00
 
     # Save logistics details
-    logistics, created = SupplyChainLogistics.objects.get_or_create(offer=offer, group=group)
-    # logistics.meeting_point_lat = ... # Resolve from Google Maps
-    # logistics.meeting_point_lon = ...
-    logistics.optimal_route_json = optimal_route_data
-    logistics.estimated_costs = estimated_cost
-    logistics.save()
-    logger.info(f"Supply chain optimized for offer {offer_id}. Meeting point: {meeting_point}")
-
-    # Notify all parties
\ No newline at end of file
+    with transaction.atomic():
+        logistics, created = SupplyChainLogistics.objects.get_or_create(offer=offer, farmer_group=group)
+        if meeting_lat is not None:
+            logistics.meeting_point_lat = Decimal(f"{meeting_lat:.6f}")
+            logistics.meeting_point_lon = Decimal(f"{meeting_lon:.6f}")
+        logistics.optimal_route_json = optimal_route_data
+        logistics.estimated_costs = estimated_cost
+        logistics.save()
+
+        # Notify all parties
+        notify(
+            [offer.buyer_id] + [farmer_id for farmer_id, _ in farmers], 'logistics_ready',
+            f"Pickup for {group.group_name} is planned. Meeting point: {meeting_point}.",
+            subject="Pickup planned",
+        )
+    logger.info(f"Supply chain optimized for offer {offer_id}. Meeting point: {meeting_point}")
\ No newline at end of file
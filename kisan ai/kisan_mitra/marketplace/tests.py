@@ -1,3 +1,225 @@
-from django.test import TestCase
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from users.models import User
+from . import dashboards
+from .dashboards import get_dashboard, invalidate_dashboards
+from .models import ProductListing, FarmerGroup, Offer, OfferVote, QueuedTask
+from .task_runner import TaskRunner, _init_process_worker, get_config, task
 
-# Create your tests here.
+calls = []
+
+
+@task(queue='votes', dedup=True)
+def record_vote_task(offer_id):
+    calls.append(('votes', offer_id))
+
+
+@task(queue='grouping')
+def record_grouping_task():
+    calls.append(('grouping', None))
+
+
+@task(queue='logistics')
+def failing_task():
+    raise RuntimeError("boom")
+
+
+def apps_ready_in_worker():
+    from django.apps import apps
+    return apps.ready
+
+
+class InlinePool:
+    """Stands in for a pool executor: runs the task before submit() returns."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+# The runner closes DB connections around each task; inside a TestCase that would drop the test transaction
+@mock.patch('marketplace.task_runner.close_old_connections')
+class TaskRunnerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def make_runner(self, **config):
+        runner = TaskRunner(config={**get_config(), 'MODE': 'worker', 'RETRY_DELAY': 0, 'MAX_ATTEMPTS': 2, **config})
+        runner.pools = {queue: InlinePool() for queue in runner.in_flight}
+        return runner
+
+    @override_settings(TASK_RUNNER={'MODE': 'worker'})
+    def test_delay_collapses_pending_duplicates(self, _):
+        first = record_vote_task.delay(7)
+        second = record_vote_task.delay(7)
+        other = record_vote_task.delay(8)
+        self.assertEqual(first.id, second.id)
+        self.assertNotEqual(first.id, other.id)
+        self.assertEqual(QueuedTask.objects.filter(dedup_key=first.dedup_key).count(), 1)
+
+    @override_settings(TASK_RUNNER={'MODE': 'worker'})
+    def test_running_copy_does_not_block_a_new_pending_one(self, _):
+        first = record_vote_task.delay(7)
+        QueuedTask.objects.filter(id=first.id).update(status='running')
+        second = record_vote_task.delay(7)
+        self.assertNotEqual(first.id, second.id)
+
+    @override_settings(TASK_RUNNER={'MODE': 'local'})
+    def test_local_mode_runs_inline(self, _):
+        self.assertIsNone(record_vote_task.delay(3))
+        self.assertEqual(calls, [('votes', 3)])
+        self.assertFalse(QueuedTask.objects.exists())
+
+    @override_settings(TASK_RUNNER={'MODE': 'worker'})
+    def test_run_once_claims_higher_priority_queues_first(self, _):
+        record_grouping_task.delay()
+        record_vote_task.delay(1)
+        self.assertEqual(self.make_runner().run_once(), 2)
+        self.assertEqual(calls, [('votes', 1), ('grouping', None)])
+        self.assertFalse(QueuedTask.objects.exists()) # finished rows are deleted
+
+    @override_settings(TASK_RUNNER={'MODE': 'worker'})
+    def test_scheduled_task_is_not_claimed_early(self, _):
+        record_vote_task.delay(1, schedule=60)
+        self.assertEqual(self.make_runner().run_once(), 0)
+
+    @override_settings(TASK_RUNNER={'MODE': 'worker'})
+    def test_failure_retries_then_fails(self, _):
+        queued = failing_task.delay()
+        runner = self.make_runner()
+
+        runner.run_once()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('pending', 1))
+        self.assertIn("boom", queued.last_error)
+        self.assertIsNone(queued.claimed_at)
+
+        runner.run_once()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertEqual(runner.run_once(), 0)
+
+    def test_spawned_process_workers_set_up_django(self, _):
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_process_worker) as pool:
+            self.assertTrue(pool.submit(apps_ready_in_worker).result(timeout=60))
+
+    def test_requeue_stale_drops_orphans_with_a_pending_copy(self, _):
+        long_ago = timezone.now() - timedelta(hours=1)
+        for status in ('running', 'running', 'pending'):
+            QueuedTask.objects.create(task_name='x', queue='votes', dedup_key='k', status=status, run_at=long_ago,
+                                      claimed_at=long_ago if status == 'running' else None)
+        for _ in range(2):
+            QueuedTask.objects.create(task_name='y', queue='votes', dedup_key='j', status='running', run_at=long_ago, claimed_at=long_ago)
+        fresh = QueuedTask.objects.create(task_name='z', queue='votes', status='running', run_at=long_ago, claimed_at=timezone.now())
+
+        self.make_runner().requeue_stale()
+
+        self.assertEqual(QueuedTask.objects.filter(dedup_key='k').count(), 1)
+        self.assertEqual(list(QueuedTask.objects.filter(dedup_key='j').values_list('status', flat=True)), ['pending'])
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, 'running') # not stale yet
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.farmer1 = User.objects.create(username='f1', pin_code='110001')
+        self.farmer2 = User.objects.create(username='f2', pin_code='110010')
+        self.outsider = User.objects.create(username='f3', pin_code='400001')
+        self.buyer = User.objects.create(username='b', user_type='buyer')
+        self.listing1, self.listing2 = [
+            ProductListing.objects.create(farmer=farmer, product_name='Wheat', quantity_kg=Decimal(100), location_pin_code=farmer.pin_code)
+            for farmer in (self.farmer1, self.farmer2)
+        ]
+        self.group = FarmerGroup.objects.create(group_name='G', leader=self.farmer1, total_quantity_kg=200)
+        self.group.products.set([self.listing1, self.listing2])
+        self.offer = Offer.objects.create(group=self.group, buyer=self.buyer, offered_price_per_kg=20, offered_quantity_kg=200)
+        self.warm()
+
+    def warm(self):
+        for kind, user in (('farmer', self.farmer1), ('farmer', self.farmer2), ('farmer', self.outsider), ('buyer', self.buyer)):
+            get_dashboard(kind, user.id)
+
+    def is_cached(self, kind, user):
+        with CaptureQueriesContext(connection) as queries:
+            get_dashboard(kind, user.id)
+        return len(queries) == 0
+
+    def test_second_read_is_served_from_cache(self):
+        self.assertTrue(self.is_cached('farmer', self.farmer1))
+        self.assertTrue(self.is_cached('buyer', self.buyer))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'kisan_mitra_cache'}})
+    def test_hit_is_one_cache_round_trip(self):
+        get_dashboard('farmer', self.farmer1.id)
+        with CaptureQueriesContext(connection) as queries:
+            get_dashboard('farmer', self.farmer1.id)
+        self.assertEqual(len(queries), 1) # generation and entry in one SELECT on the cache table
+
+    def test_listing_change_invalidates_only_its_farmer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductListing.objects.create(farmer=self.outsider, product_name='Rice', quantity_kg=Decimal(5), location_pin_code='400001')
+        self.assertFalse(self.is_cached('farmer', self.outsider))
+        self.assertTrue(self.is_cached('farmer', self.farmer1))
+        self.assertTrue(self.is_cached('buyer', self.buyer))
+
+    def test_group_membership_change_invalidates_members_and_buyers(self):
+        listing3 = ProductListing.objects.create(farmer=self.outsider, product_name='Wheat', quantity_kg=Decimal(5), location_pin_code='400001')
+        self.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.products.add(listing3)
+        for kind, user in (('farmer', self.farmer1), ('farmer', self.farmer2), ('farmer', self.outsider), ('buyer', self.buyer)):
+            self.assertFalse(self.is_cached(kind, user), (kind, user.username))
+        self.assertEqual(len(get_dashboard('farmer', self.outsider.id)['groups']), 1)
+
+    def test_group_delete_invalidates_members_and_buyers(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+        self.assertEqual(get_dashboard('farmer', self.farmer2.id)['groups'], [])
+        self.assertEqual(get_dashboard('buyer', self.buyer.id)['offers'], [])
+        self.assertTrue(self.is_cached('farmer', self.outsider))
+
+    def test_offer_invalidates_group_farmers_and_buyer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Offer.objects.create(group=self.group, buyer=self.buyer, offered_price_per_kg=25, offered_quantity_kg=100)
+        self.assertEqual(len(get_dashboard('farmer', self.farmer2.id)['pending_offers']), 2)
+        self.assertEqual(len(get_dashboard('buyer', self.buyer.id)['offers']), 2)
+        self.assertTrue(self.is_cached('farmer', self.outsider))
+
+    def test_vote_invalidates_voter_and_buyer_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            OfferVote.objects.create(offer=self.offer, farmer=self.farmer2, vote='accept')
+        self.assertEqual(get_dashboard('farmer', self.farmer2.id)['pending_offers'], [])
+        self.assertEqual(get_dashboard('buyer', self.buyer.id)['offers'][0]['accept_votes'], 1)
+        self.assertTrue(self.is_cached('farmer', self.farmer1))
+
+    def test_invalidation_during_a_build_is_not_undone(self):
+        # A reader builds from pre-commit data while the writer's on_commit invalidation lands
+        stale_build = dashboards.BUILDERS['farmer']
+
+        def build_then_invalidate(user_id):
+            summary = stale_build(user_id)
+            invalidate_dashboards(farmer_ids=[user_id])
+            return summary
+
+        invalidate_dashboards(farmer_ids=[self.farmer1.id])
+        with mock.patch.dict(dashboards.BUILDERS, {'farmer': build_then_invalidate}):
+            get_dashboard('farmer', self.farmer1.id)
+        self.assertFalse(self.is_cached('farmer', self.farmer1))
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/farmer/', views.farmer_dashboard, name='farmer_dashboard'),
+    path('dashboard/buyer/', views.buyer_dashboard, name='buyer_dashboard'),
+    path('listings/new/', views.create_listing, name='create_listing'),
+    path('groups/', views.view_product_groups, name='view_product_groups'),
+    path('groups/<int:group_id>/offer/', views.make_offer, name='make_offer'),
+    path('offers/<int:offer_id>/review/', views.review_offer, name='review_offer'),
+]
@@ -2,9 +2,12 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
+from django.db import transaction
 from .models import ProductListing, FarmerGroup, Offer, OfferVote
 from .forms import ProductListingForm, OfferForm, OfferVoteForm
 from .tasks import process_offer_votes # Import the background task
+from .dashboards import get_dashboard
+from notifications.services import notify
 
 def is_farmer(user):
     return user.is_authenticated and user.user_type == 'farmer'
@@ -12,6 +15,23 @@ def is_farmer(user):
 def is_buyer(user):
     return user.is_authenticated and user.user_type == 'buyer'
 
+@login_required
+def dashboard(request):
+    return redirect('farmer_dashboard' if request.user.user_type == 'farmer' else 'buyer_dashboard')
+
+@login_required
+@user_passes_test(is_farmer)
+def farmer_dashboard(request):
+    # One cache hit on the common path; see dashboards.py for how entries are invalidated
+    summary = get_dashboard('farmer', request.user.id)
+    return render(request, 'marketplace/farmer_dashboard.html', summary)
+
+@login_required
+@user_passes_test(is_buyer)
+def buyer_dashboard(request):
+    summary = get_dashboard('buyer', request.user.id)
+    return render(request, 'marketplace/buyer_dashboard.html', summary)
+
 @login_required
 @user_passes_test(is_farmer)
 def create_listing(request):
@@ -42,8 +62,15 @@ def make_offer(request, group_id):
             offer = form.save(commit=False)
             offer.group = group
             offer.buyer = request.user
-            offer.save()
-            # Notify group leader or members about the new offer
+            with transaction.atomic():
+                offer.save()
+                # Notify group leader and members about the new offer
+                member_ids = list(group.products.values_list('farmer_id', flat=True))
+                notify(
+                    [group.leader_id] + member_ids, 'offer_received',
+                    f"New offer on {group.group_name}: ₹{offer.offered_price_per_kg}/kg for {offer.offered_quantity_kg}kg. Please vote.",
+                    subject="New offer to vote on",
+                )
             return redirect('buyer_dashboard')
     else:
         form = OfferForm(initial={'offered_quantity_kg': group.total_quantity_kg})
@@ -68,8 +95,7 @@ def review_offer(request, offer_id):
                     comment=form.cleaned_data.get('comment')
                 )
                 # Trigger the background task to re-evaluate offer status after a vote
-                process_offer_votes.now(offer.id) # .now() runs synchronously for testing/immediate trigger
-                                                # For production, use .delay() with Celery or .schedule() with django-background-tasks
+                process_offer_votes.delay(offer.id) # Queued for the task runner; runs inline when TASK_RUNNER['MODE'] == 'local'
                 return JsonResponse({'message': 'Vote recorded successfully!'})
             except Exception as e:
                 return JsonResponse({'error': f'Failed to record vote: {e}'}, status=400)
@@ -0,0 +1,186 @@
+"""
+Batched outbox dispatcher.
+
+Each pass claims up to NOTIFICATION_BATCH_SIZE pending rows in one query, folds
+them per channel and per recipient (three updates for one farmer become one
+SMS), resolves phone numbers/emails with one query, and hands each channel's
+messages to its provider in provider-sized chunks, throttled by a token bucket
+per channel (NOTIFICATION_RATE_LIMITS, messages per second). Outcomes are
+written back with bulk UPDATEs. Rows a dispatcher claimed but never settled
+(killed mid-pass by a deploy, a DB error) go back to 'pending' after
+NOTIFICATION_SENDING_TIMEOUT, so delivery is at-least-once.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from users.models import User
+from .models import Notification
+from .providers import OutgoingMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDERS = {
+    'sms': 'notifications.providers.FakeProvider',
+    'in_app': 'notifications.providers.InAppProvider',
+    'email': 'notifications.providers.EmailProvider',
+}
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 60 # seconds before a failed send is retried
+SENDING_TIMEOUT = 15 * 60 # default for settings.NOTIFICATION_SENDING_TIMEOUT
+
+
+class RateLimiter:
+    """Token bucket: allows `rate` messages per second with bursts up to max(rate, 1)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, 1) # a fractional rate still has to fill to one whole message
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, count):
+        while count > 0:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                taken = min(count, int(self.tokens))
+                self.tokens -= taken
+                count -= taken
+                # Sleep until the tokens still missing for the next chunk have accrued
+                wait = (min(count, int(self.capacity)) - self.tokens) / self.rate if count else 0
+            if wait > 0:
+                time.sleep(wait)
+
+
+_providers = {}
+_limiters = {}
+
+
+def get_provider(channel):
+    if channel not in _providers:
+        path = getattr(settings, 'NOTIFICATION_PROVIDERS', {}).get(channel, DEFAULT_PROVIDERS[channel])
+        _providers[channel] = import_string(path)()
+    return _providers[channel]
+
+
+def get_limiter(channel):
+    rate = getattr(settings, 'NOTIFICATION_RATE_LIMITS', {}).get(channel)
+    if not rate:
+        return None
+    if channel not in _limiters:
+        _limiters[channel] = RateLimiter(rate)
+    return _limiters[channel]
+
+
+def claim_batch(limit):
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by('created_at')
+            .values('id', 'recipient_id', 'channel', 'subject', 'message', 'attempts')[:limit]
+        )
+        if rows:
+            Notification.objects.filter(id__in=[row['id'] for row in rows]).update(status='sending', claimed_at=now)
+    return rows
+
+
+def requeue_stale_sends():
+    """Puts rows stuck in 'sending' past the timeout back in the queue. Returns how many."""
+    timeout = getattr(settings, 'NOTIFICATION_SENDING_TIMEOUT', SENDING_TIMEOUT)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    requeued = Notification.objects.filter(status='sending', claimed_at__lt=cutoff).update(status='pending', claimed_at=None)
+    if requeued:
+        logger.warning(f"Requeued {requeued} notifications stuck in 'sending' for over {timeout}s")
+    return requeued
+
+
+def fold_messages(rows, addresses):
+    """({channel: [OutgoingMessage]} with one message per recipient, ids of rows with no address)."""
+    by_channel = defaultdict(lambda: defaultdict(list))
+    for row in rows:
+        by_channel[row['channel']][row['recipient_id']].append(row)
+
+    messages, unreachable = defaultdict(list), set()
+    for channel, by_recipient in by_channel.items():
+        for recipient_id, recipient_rows in by_recipient.items():
+            address = recipient_id if channel == 'in_app' else addresses.get(recipient_id, {}).get(channel)
+            ids = [row['id'] for row in recipient_rows]
+            if not address:
+                unreachable.update(ids)
+                continue
+            subject = recipient_rows[0]['subject'] if len(recipient_rows) == 1 else f"{len(recipient_rows)} updates from Kisan Mitra"
+            body = '\n\n'.join(row['message'] for row in recipient_rows)
+            messages[channel].append(OutgoingMessage(ids, address, subject, body))
+    return messages, unreachable
+
+
+def record_results(sent_ids, failed):
+    now = timezone.now()
+    if sent_ids:
+        Notification.objects.filter(id__in=sent_ids).update(status='sent', sent_at=now, attempts=F('attempts') + 1)
+    by_error = defaultdict(list)
+    for notification_id, error in failed.items():
+        by_error[error].append(notification_id)
+    for error, ids in by_error.items():
+        Notification.objects.filter(id__in=ids).update(
+            status='pending', attempts=F('attempts') + 1, last_error=error[:1000],
+            next_attempt_at=now + timedelta(seconds=RETRY_DELAY),
+        )
+    if failed:
+        Notification.objects.filter(id__in=list(failed), attempts__gte=MAX_ATTEMPTS).update(status='failed')
+
+
+def dispatch_pending(batch_size=None, max_batches=None):
+    """Delivers pending notifications until the outbox is drained. Returns counts per outcome."""
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+    counts = {'requeued': requeue_stale_sends(), 'rows': 0, 'messages': 0, 'provider_calls': 0, 'sent': 0, 'failed': 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = claim_batch(batch_size)
+        if not rows:
+            break
+        batches += 1
+        counts['rows'] += len(rows)
+
+        recipient_ids = {row['recipient_id'] for row in rows if row['channel'] != 'in_app'}
+        addresses = {
+            user_id: {'sms': phone_number, 'email': email}
+            for user_id, phone_number, email in User.objects.filter(id__in=recipient_ids).values_list('id', 'phone_number', 'email')
+        }
+        messages, unreachable = fold_messages(rows, addresses)
+        if unreachable:
+            # Retrying won't conjure up a phone number; fail these straight away
+            Notification.objects.filter(id__in=list(unreachable)).update(status='failed', last_error="Recipient has no address for this channel")
+        failed = {}
+
+        for channel, channel_messages in messages.items():
+            provider, limiter = get_provider(channel), get_limiter(channel)
+            for start in range(0, len(channel_messages), provider.max_batch):
+                chunk = channel_messages[start:start + provider.max_batch]
+                if limiter:
+                    limiter.acquire(len(chunk))
+                try:
+                    failed.update(provider.send_batch(chunk))
+                except Exception as e:
+                    logger.error(f"{channel} provider failed a batch of {len(chunk)}: {e}")
+                    failed.update({notification_id: str(e) for message in chunk for notification_id in message.notification_ids})
+                counts['provider_calls'] += 1
+                counts['messages'] += len(chunk)
+
+        sent_ids = [row['id'] for row in rows if row['id'] not in failed and row['id'] not in unreachable]
+        record_results(sent_ids, failed)
+        counts['sent'] += len(sent_ids)
+        counts['failed'] += len(failed) + len(unreachable)
+    return counts
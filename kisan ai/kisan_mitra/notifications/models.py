@@ -0,0 +1,31 @@
+from django.db import models
+from users.models import User
+
+class Notification(models.Model):
+    # Outbox row: written in the same transaction as the state change it announces,
+    # delivered later in batches by notifications.dispatcher. In-app rows double as the inbox.
+    CHANNEL_CHOICES = [('sms', 'SMS'), ('in_app', 'In-app'), ('email', 'Email')]
+    STATUS_CHOICES = [('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')]
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    event = models.CharField(max_length=50) # e.g. 'group_created', 'offer_accepted'
+    subject = models.CharField(max_length=255, blank=True)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True) # retry backoff after a failed send
+    claimed_at = models.DateTimeField(null=True, blank=True) # when a dispatcher moved it to 'sending'
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'channel', 'created_at']), # dispatcher claim
+            models.Index(fields=['recipient', 'channel', 'created_at']), # in-app inbox
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient_id}: {self.message[:50]}"
@@ -0,0 +1,64 @@
+"""
+Delivery providers, one per channel (settings.NOTIFICATION_PROVIDERS).
+
+A provider receives a whole batch of OutgoingMessages and returns the ids of
+the ones that failed; rate limiting and batching are the dispatcher's job.
+"""
+import logging
+from django.conf import settings
+from django.core.mail import get_connection, EmailMessage
+
+logger = logging.getLogger(__name__)
+
+
+class OutgoingMessage:
+    def __init__(self, notification_ids, address, subject, body):
+        self.notification_ids = notification_ids # every outbox row folded into this message
+        self.address = address
+        self.subject = subject
+        self.body = body
+
+
+class BaseProvider:
+    max_batch = 100 # messages per send_batch call (provider bulk API limit)
+
+    def send_batch(self, messages):
+        """Delivers messages; returns {notification_id: error} for the ones that failed."""
+        raise NotImplementedError
+
+
+class FakeProvider(BaseProvider):
+    """Records batches instead of delivering them. Used for SMS until a vendor is wired in, and in tests."""
+    sent_batches = [] # shared, like django.core.mail.outbox
+
+    def send_batch(self, messages):
+        FakeProvider.sent_batches.append(list(messages))
+        logger.info(f"FakeProvider accepted a batch of {len(messages)} messages")
+        return {}
+
+
+class InAppProvider(BaseProvider):
+    """In-app notifications are read straight from the outbox table; delivery just marks them sent."""
+    max_batch = 1000
+
+    def send_batch(self, messages):
+        return {}
+
+
+class EmailProvider(BaseProvider):
+    """Sends through Django's email backend over a single connection per batch."""
+    max_batch = 50
+
+    def send_batch(self, messages):
+        failed = {}
+        connection = get_connection(fail_silently=False)
+        connection.open()
+        try:
+            for message in messages:
+                try:
+                    EmailMessage(message.subject, message.body, settings.DEFAULT_FROM_EMAIL, [message.address], connection=connection).send()
+                except Exception as e:
+                    failed.update({notification_id: str(e) for notification_id in message.notification_ids})
+        finally:
+            connection.close()
+        return failed
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import transaction
+from .models import Notification
+
+
+def default_channels():
+    return getattr(settings, 'NOTIFICATION_DEFAULT_CHANNELS', ['in_app', 'sms'])
+
+
+def notify(recipient_ids, event, message, subject='', channels=None):
+    """
+    Queues one notification per recipient and channel with a single bulk INSERT.
+
+    Call it inside the transaction that makes the change being announced: the rows
+    commit or roll back with it, and delivery is only scheduled once it commits.
+    """
+    recipient_ids = [user_id for user_id in dict.fromkeys(recipient_ids) if user_id]
+    rows = [
+        Notification(recipient_id=user_id, channel=channel, event=event, subject=subject, message=message)
+        for user_id in recipient_ids
+        for channel in (channels or default_channels())
+    ]
+    if not rows:
+        return 0
+    Notification.objects.bulk_create(rows)
+    transaction.on_commit(_schedule_dispatch)
+    return len(rows)
+
+
+def _schedule_dispatch():
+    from .tasks import dispatch_notifications
+    dispatch_notifications.delay()
@@ -0,0 +1,11 @@
+import logging
+from marketplace.task_runner import task
+from .dispatcher import dispatch_pending
+
+logger = logging.getLogger(__name__)
+
+
+@task(queue='notifications', dedup=True) # Many state changes in a burst share one dispatch run
+def dispatch_notifications():
+    counts = dispatch_pending()
+    logger.info(f"Dispatched notifications: {counts}")
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from users.models import User
+from . import dispatcher
+from .dispatcher import MAX_ATTEMPTS, RateLimiter, dispatch_pending
+from .models import Notification
+from .providers import BaseProvider, FakeProvider
+from .services import notify
+
+
+class FailingProvider(BaseProvider):
+    def send_batch(self, messages):
+        return {notification_id: "gateway down" for message in messages for notification_id in message.notification_ids}
+
+
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+
+        def sleep(seconds):
+            self.now += seconds
+            self.sleeps.append(seconds)
+
+        self.sleeps = []
+        patcher = mock.patch.object(dispatcher, 'time', SimpleNamespace(monotonic=lambda: self.now, sleep=sleep))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fractional_rate_waits_for_a_whole_token(self):
+        limiter = RateLimiter(0.5)
+        limiter.acquire(1) # the initial burst
+        limiter.acquire(2)
+        self.assertAlmostEqual(self.now, 4.0) # one message every two seconds
+
+    def test_whole_rate_bursts_then_paces(self):
+        limiter = RateLimiter(10)
+        limiter.acquire(25)
+        self.assertAlmostEqual(self.now, 1.5)
+        self.assertEqual(len(self.sleeps), 2)
+
+
+@override_settings(
+    NOTIFICATION_PROVIDERS={'sms': 'notifications.providers.FakeProvider', 'in_app': 'notifications.providers.InAppProvider'},
+    NOTIFICATION_RATE_LIMITS={},
+    TASK_RUNNER={'MODE': 'worker'},
+)
+class NotificationTests(TestCase):
+    def setUp(self):
+        dispatcher._providers.clear()
+        dispatcher._limiters.clear()
+        FakeProvider.sent_batches.clear()
+        self.farmers = User.objects.bulk_create([User(username=f'f{i}', phone_number=f'9{i:09d}') for i in range(250)])
+
+    def test_notify_is_one_bulk_insert_and_one_dispatch_after_commit(self):
+        ids = [farmer.id for farmer in self.farmers[:30]] # small enough for one statement under SQLite's parameter limit
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+            created = notify(ids + ids[:10] + [None], 'group_created', "You joined a group")
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "notifications_notification"')]
+        self.assertEqual(created, 60) # duplicates and None dropped; in_app + sms each
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_dispatch_sends_in_provider_sized_batches(self):
+        notify([farmer.id for farmer in self.farmers], 'group_created', "You joined a group")
+        counts = dispatch_pending()
+        self.assertEqual([len(batch) for batch in FakeProvider.sent_batches], [100, 100, 50])
+        self.assertEqual(counts['provider_calls'], 4) # three SMS batches + one in-app batch
+        self.assertEqual(counts['sent'], 500)
+        self.assertFalse(Notification.objects.exclude(status='sent').exists())
+
+    def test_messages_for_one_recipient_are_folded(self):
+        farmer = self.farmers[0]
+        for n in range(3):
+            notify([farmer.id], 'offer', f"Update {n}", channels=['sms'])
+        dispatch_pending()
+        [[message]] = FakeProvider.sent_batches
+        self.assertEqual(len(message.notification_ids), 3)
+        self.assertIn("Update 2", message.body)
+        self.assertEqual(message.address, farmer.phone_number)
+
+    def test_recipient_without_address_fails_without_a_send(self):
+        no_phone = User.objects.create(username='nophone')
+        notify([no_phone.id], 'offer', "Hi", channels=['sms'])
+        counts = dispatch_pending()
+        self.assertEqual(FakeProvider.sent_batches, [])
+        self.assertEqual(counts['failed'], 1)
+        self.assertEqual(Notification.objects.get().status, 'failed')
+
+    @override_settings(NOTIFICATION_PROVIDERS={'sms': 'notifications.tests.FailingProvider'})
+    def test_failed_send_backs_off_then_gives_up(self):
+        notify([self.farmers[0].id], 'offer', "Hi", channels=['sms'])
+        dispatch_pending()
+        row = Notification.objects.get()
+        self.assertEqual((row.status, row.attempts, row.last_error), ('pending', 1, "gateway down"))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        self.assertEqual(dispatch_pending()['rows'], 0) # not due yet
+
+        Notification.objects.update(attempts=MAX_ATTEMPTS - 1, next_attempt_at=None)
+        dispatch_pending()
+        self.assertEqual(Notification.objects.get().status, 'failed')
+
+    def test_rows_stuck_in_sending_are_retried(self):
+        notify([farmer.id for farmer in self.farmers[:2]], 'offer', "Hi", channels=['sms'])
+        stuck, recent = Notification.objects.order_by('id')
+        Notification.objects.filter(id=stuck.id).update(status='sending', claimed_at=timezone.now() - timedelta(hours=1))
+        Notification.objects.filter(id=recent.id).update(status='sending', claimed_at=timezone.now())
+
+        counts = dispatch_pending()
+
+        self.assertEqual((counts['requeued'], counts['sent']), (1, 1))
+        stuck.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((stuck.status, recent.status), ('sent', 'sending'))